@@ -1,12 +1,15 @@
-from src.agents.agent_router import AgentRouter
-from src.agents.product_advisor import ProductAdvisorAgent
-from src.agents.policy_advisor import PolicyAdvisorAgent
-from src.agents.pc_builder import PCBuilderAgent
-from src.agents.order_processor import OrderProcessorAgent
-from src.agents.general_advisor import GeneralAdvisorAgent
+from src.services.startup_report import startup_report
+from src.agents.lazy_agents import LazyAgents, create_router
+from src.services.query_embedding import request_embedding_scope
+from src.services.session_state import session_scope
+from src.services.speculation import speculative_prework
+from src.services.event_loop import get_background_loop
+from src.services.streaming import stream_to
+from src.config import STREAM_RESPONSES
+from contextlib import nullcontext
 import streamlit as st
 import uuid
-import asyncio
+import queue
 import threading
 import os
 import sys
@@ -39,9 +42,6 @@ if "agents" not in st.session_state:
 if "advised_products" not in st.session_state:
     st.session_state.advised_products = []
 
-if "default_agent" not in st.session_state:
-    st.session_state.default_agent = None
-
 if "order_form_data" not in st.session_state:
     st.session_state.order_form_data = None
 
@@ -84,40 +84,50 @@ def initialize_agents():
     if st.session_state.initialized:
         return
 
-    with st.spinner("Đang khởi tạo hệ thống trợ lý..."):
-        st.session_state.agent_router = AgentRouter()
+    # The router and each agent are built on first use, so a session starts
+    # without importing the agents SDK, chromadb or openai
+    st.session_state.agent_router = None
+    st.session_state.agents = LazyAgents()
 
-        st.session_state.agents = {
-            "product_advisor": ProductAdvisorAgent(),
-            "policy_advisor": PolicyAdvisorAgent(),
-            "pc_builder": PCBuilderAgent(),
-            "order_processor": OrderProcessorAgent(),
-            "general": GeneralAdvisorAgent(),
-        }
+    st.session_state.initialized = True
 
-        st.session_state.default_agent = st.session_state.agents["general"]
 
-        st.session_state.initialized = True
+def get_agent_router():
+    if st.session_state.agent_router is None:
+        st.session_state.agent_router = create_router()
+    return st.session_state.agent_router
 
 
-async def process_query(query, language="vi"):
+async def process_query(query, agent_router, agents, language="vi", on_delta=None, session_id=None):
+    # Runs on the background loop thread, so it must not touch
+    # st.session_state; the caller passes in the session's router, agents
+    # and id. Every Chroma query for this message reuses one embedding per
+    # text, and with on_delta the answer is handed over while it is generated
+    streaming = stream_to(on_delta) if on_delta else nullcontext()
+    with session_scope(session_id), request_embedding_scope(), streaming:
+        response = await _process_query(query, agent_router, agents, language)
+    startup_report.mark_first_response()
+    return response
+
+
+async def _process_query(query, agent_router, agents, language="vi"):
     try:
-        agent_type = await st.session_state.agent_router.route_query(query)
+        async with speculative_prework(query, language) as speculation:
+            agent_type = await agent_router.route_query(query)
+            if speculation is not None:
+                speculation.keep_for(agent_type)
 
-        agent_instance = st.session_state.agents.get(agent_type)
-        if not agent_instance:
-            agent_instance = st.session_state.default_agent
+            agent_instance = agents.get(agent_type)
+            if not agent_instance:
+                agent_instance = agents.get("general")
 
-        response = await agent_instance.handle_query(query, language)
+            response = await agent_instance.handle_query(query, language)
 
         if agent_type in ["product_advisor", "pc_builder"] and hasattr(agent_instance, "recently_advised_products"):
-            st.session_state.agent_router.set_recently_advised_products(
+            agent_router.set_recently_advised_products(
                 agent_instance.recently_advised_products)
 
         if isinstance(response, dict) and "show_order_form" in response:
-            st.session_state.pending_order_products = response.get(
-                "products", [])
-
             agent_response = {
                 "content": response["content"],
                 "sender": agent_instance.agent.name
@@ -127,7 +137,8 @@ async def process_query(query, language="vi"):
                 "role": "assistant",
                 "content": response["content"],
                 "agent_responses": [agent_response],
-                "show_order_form": True
+                "show_order_form": True,
+                "order_products": response.get("products", [])
             }
         else:
             agent_response = {
@@ -152,13 +163,43 @@ async def process_query(query, language="vi"):
         }
 
 
+def run_query_in_background(query):
+    if not STREAM_RESPONSES:
+        response = get_background_loop().run(process_query(
+            query, get_agent_router(), st.session_state.agents,
+            session_id=st.session_state.session_id))
+    else:
+        deltas = queue.Queue()
+        future = get_background_loop().submit(process_query(
+            query, get_agent_router(), st.session_state.agents, on_delta=deltas.put,
+            session_id=st.session_state.session_id))
+
+        # Draw the answer as it arrives; the finished message replaces it
+        # on the next rerun
+        placeholder = None
+        streamed_text = ""
+        while not (future.done() and deltas.empty()):
+            try:
+                streamed_text += deltas.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if placeholder is None:
+                placeholder = st.chat_message(
+                    "assistant", avatar="⏳").empty()
+            placeholder.markdown(streamed_text + "▌")
+
+        response = future.result()
+
+    if "order_products" in response:
+        st.session_state.pending_order_products = response.pop(
+            "order_products")
+    return response
+
+
 def run_async_query(query):
     try:
         st.session_state.processing = True
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        response = loop.run_until_complete(process_query(query))
-        loop.close()
+        response = run_query_in_background(query)
 
         if "messages" not in st.session_state:
             st.session_state.messages = []
@@ -261,15 +302,11 @@ else:
 
 if st.session_state.processing:
     with st.spinner("Đang xử lý..."):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
         user_messages = [
             m for m in st.session_state.messages if m["role"] == "user"]
         if user_messages:
             latest_query = user_messages[-1]["content"]
-            response = loop.run_until_complete(process_query(latest_query))
-            loop.close()
+            response = run_query_in_background(latest_query)
 
             st.session_state.messages.append(response)
 
@@ -314,6 +351,13 @@ with st.sidebar:
         st.caption(
             f"Trạng thái: {'Đang xử lý' if st.session_state.processing else 'Sẵn sàng'}")
         st.caption(f"Agents đã khởi tạo: {st.session_state.initialized}")
+        if st.session_state.initialized:
+            st.caption(
+                f"Agents đã tải: {', '.join(st.session_state.agents.built()) or 'chưa có'}")
+
+        st.caption("Thời gian khởi động:")
+        for line in startup_report.lines():
+            st.caption(line)
 
         if st.button("Khởi động lại agents"):
             st.session_state.initialized = False
@@ -1,8 +1,10 @@
 from typing import Dict, Any, List
 from agents import Agent, OpenAIChatCompletionsModel
-from openai import AsyncOpenAI
+from src.services.resource_registry import get_async_openai_client
 from src.services.shared_state import SharedStateService
-from src.config import OPENAI_API_KEY, OPENAI_MODEL
+from src.config import (OPENAI_MODEL, INTENT_LOCAL_CLASSIFIER, INTENT_LOCAL_MIN_CONFIDENCE,
+                        STICKY_ROUTING, STICKY_SHIFT_MIN_CONFIDENCE)
+from src.services.stage_timer import stage
 import json
 import re
 
@@ -29,6 +31,10 @@ def extract_json_from_response(response_text):
     return response_text.strip()
 
 
+# Agents whose follow-up questions stay with them until the topic changes
+STICKY_AGENTS = {"product_advisor", "policy_advisor", "pc_builder"}
+
+
 class AgentRouter:
     def __init__(self, config=None):
         self.config = config or {}
@@ -44,7 +50,7 @@ class AgentRouter:
 
         self.model_client = OpenAIChatCompletionsModel(
             model=OPENAI_MODEL,
-            openai_client=AsyncOpenAI(api_key=OPENAI_API_KEY)
+            openai_client=get_async_openai_client()
         )
 
         # Create intent classifier agent
@@ -99,21 +105,68 @@ class AgentRouter:
             """,
         )
 
+        # Follow-up turns after product advice: intent and order intent come
+        # from one call to this long-lived agent instead of two serial calls
+        self.context_router = Agent(
+            name="ContextRouter",
+            model=self.model_client,
+            instructions="""
+            Bạn là AI điều phối hội thoại của cửa hàng máy tính TechPlus. Khách hàng vừa được tư vấn
+            một số sản phẩm. Với mỗi tin nhắn mới, hãy đồng thời:
+            
+            1. Phân loại ý định vào một trong các danh mục:
+            - product_advisor: hỏi, tư vấn, so sánh linh kiện (CPU, GPU, RAM, Mainboard, SSD/HDD, PSU, Case, tản nhiệt)
+            - policy_advisor: bảo hành, đổi trả, hoàn tiền, thanh toán, trả góp, vận chuyển, bảo mật
+            - pc_builder: xây dựng, tư vấn hoặc sửa cấu hình PC hoàn chỉnh
+            - order_processor: đặt hàng, mua, chốt đơn, xác nhận mua
+            - general: chào hỏi và hỏi đáp chung
+            
+            2. Xác định khách có muốn đặt mua sản phẩm đã được tư vấn hay không, và phân biệt:
+            - Đặt MỘT sản phẩm cụ thể (ví dụ: "đặt hàng chip Intel i5 14600X") -> single_product = true
+            - Đặt TẤT CẢ sản phẩm đã tư vấn (ví dụ: "đặt hàng cấu hình này") -> single_product = false
+            
+            Các từ khóa liên quan đến đặt hàng: mua, đặt, order, thanh toán, lấy, chốt đơn, xác nhận, đồng ý, ok
+            Các từ khóa liên quan đến toàn bộ cấu hình: cấu hình, pc, máy tính, bộ máy, tất cả, toàn bộ, những sản phẩm này
+            Các từ khóa chỉ định một sản phẩm: sản phẩm này, chip, card, ram, cpu, ổ cứng, kèm theo tên cụ thể
+            
+            Chỉ trả về JSON với format:
+            {
+                "intent": "<product_advisor|policy_advisor|pc_builder|order_processor|general>",
+                "confidence": <độ tin cậy của intent từ 0.0 đến 1.0>,
+                "is_ordering": true/false,
+                "order_confidence": <độ tin cậy của ý định đặt hàng từ 0.0 đến 1.0>,
+                "single_product": true/false,
+                "mentioned_product": "<tên sản phẩm cụ thể nếu được nhắc đến, nếu không thì để trống>",
+                "reasoning": "<giải thích ngắn gọn>"
+            }
+            """,
+        )
+
     def set_recently_advised_products(self, products: List[Dict[str, Any]]):
         self.shared_state.set_recently_advised_products(products)
         print(f"AgentRouter: Đã lưu trữ sản phẩm tư vấn gần nhất qua SharedStateService")
 
     async def classify_intent(self, user_query: str) -> Dict[str, Any]:
+        if INTENT_LOCAL_CLASSIFIER:
+            from src.services.intent_classifier import get_intent_classifier
+            with stage("route"):
+                local_result = get_intent_classifier().classify(user_query)
+            if local_result["confidence"] >= INTENT_LOCAL_MIN_CONFIDENCE:
+                return local_result
+            print(
+                f"Phân loại cục bộ chưa chắc chắn ({local_result['intent']}, {local_result['confidence']}), hỏi LLM")
+
         try:
             from agents import Runner
 
             prompt = f"Phân loại đoạn text này: \"{user_query}\""
 
-            response = await Runner.run(
-                self.intent_classifier,
-                [{"role": "system", "content": self.intent_classifier.instructions},
-                 {"role": "user", "content": prompt}]
-            )
+            with stage("route"):
+                response = await Runner.run(
+                    self.intent_classifier,
+                    [{"role": "system", "content": self.intent_classifier.instructions},
+                     {"role": "user", "content": prompt}]
+                )
 
             try:
                 response_text = response.final_output
@@ -159,7 +212,85 @@ class AgentRouter:
                 "reasoning": f"Error in classification: {e}, defaulting to general agent"
             }
 
+    async def route_with_context(self, user_query: str, recently_advised_products, recently_advised_pc=False):
+        """Intent and order intent of a follow-up turn in a single LLM call.
+
+        Returns None when the call or its JSON fails, so the caller can fall
+        back to the separate classifiers.
+        """
+        try:
+            from agents import Runner
+
+            product_list = "".join(
+                f"- {product.get('name', 'Unknown')} ({product.get('category', 'Unknown')})\n"
+                for product in recently_advised_products)
+            prompt = f"""Tin nhắn của khách hàng: "{user_query}"
+
+            Các sản phẩm đã được tư vấn gần đây:
+            {product_list}
+            Đây {'' if recently_advised_pc else 'không'} là một cấu hình PC đầy đủ."""
+
+            with stage("route"):
+                response = await Runner.run(
+                    self.context_router, [{"role": "user", "content": prompt}])
+
+            result = json.loads(
+                extract_json_from_response(response.final_output))
+
+            intent = result.get("intent")
+            confidence = float(result.get("confidence", 0.0))
+            if intent not in self.agent_types:
+                intent, confidence = "general", 0.5
+
+            return {
+                "intent": intent,
+                "confidence": confidence,
+                "is_ordering": bool(result.get("is_ordering", False)),
+                "order_confidence": float(result.get("order_confidence", 0.0)),
+                "single_product": bool(result.get("single_product", False)),
+                "mentioned_product": result.get("mentioned_product") or "",
+                "reasoning": result.get("reasoning", "")
+            }
+        except Exception as e:
+            print(f"Lỗi khi định tuyến theo ngữ cảnh: {e}")
+            return None
+
     async def route_query(self, user_query: str) -> str:
+        agent_type = await self._route_query(user_query)
+        self.shared_state.set_session_data("last_agent", agent_type)
+        return agent_type
+
+    def keep_previous_agent(self, user_query: str):
+        """Previous agent when this message continues its topic, else None.
+
+        Only the search agents are sticky; general and order turns are short
+        and are classified again.
+        """
+        previous_agent = self.shared_state.get_session_data("last_agent")
+        if not STICKY_ROUTING or previous_agent not in STICKY_AGENTS:
+            return None
+
+        from src.services.intent_classifier import get_intent_classifier
+        from src.services.topic_shift import TopicShiftDetector, is_follow_up
+
+        follow_up = is_follow_up(user_query)
+        # "Đổi GPU sang loại rẻ hơn" right after a build continues that build
+        if not follow_up and previous_agent == "pc_builder" and self.shared_state.get_session_data("pc_build"):
+            from src.services.build_editor import parse_build_edit
+            follow_up = parse_build_edit(user_query) is not None
+
+        detector = TopicShiftDetector(
+            get_intent_classifier(), min_confidence=STICKY_SHIFT_MIN_CONFIDENCE)
+        with stage("route"):
+            shifted, local_result = detector.detect(
+                user_query, previous_agent, follow_up=follow_up)
+        if shifted:
+            print(
+                f"Phát hiện chuyển chủ đề: {previous_agent} -> {local_result['intent']} ({local_result['confidence']})")
+            return None
+        return previous_agent
+
+    async def _route_query(self, user_query: str) -> str:
         order_keywords = ["đặt hàng", "mua ngay", "order", "thanh toán", "mua", "đặt", "lấy",
                           "chốt đơn", "xác nhận", "đồng ý", "ok", "được", "chốt"]
         config_keywords = ["cấu hình", "pc", "máy tính", "bộ máy", "như trên", "vừa rồi",
@@ -181,28 +312,40 @@ class AgentRouter:
                     "Phát hiện ý định đặt hàng cấu hình, chuyển hướng đến order_processor")
                 return "order_processor"
 
+        # Order keywords keep priority over the previous agent
+        if not any(keyword in user_query.lower() for keyword in order_keywords):
+            previous_agent = self.keep_previous_agent(user_query)
+            if previous_agent:
+                print(f"Tiếp tục hội thoại với {previous_agent}")
+                return previous_agent
+
+        intent_result = None
         if recently_advised_products:
-            try:
-                from src.agents.order_processor import OrderProcessorAgent
-                order_processor = OrderProcessorAgent()
-                result = await order_processor.detect_advised_pc_intent(user_query)
-                if len(result) == 5:
-                    is_ordering_pc, confidence, reasoning, is_mentioned, mentioned_part = result
-                else:
-                    is_ordering_pc, confidence, reasoning = result
-
-                if is_ordering_pc and confidence >= 0.7:
+            decision = await self.route_with_context(
+                user_query, recently_advised_products, recently_advised_pc)
+            if decision is not None:
+                # The order processor reuses this instead of asking again
+                self.shared_state.set_session_data("order_intent", {
+                    "query": user_query,
+                    "is_ordering": decision["is_ordering"],
+                    "confidence": decision["order_confidence"],
+                    "reasoning": decision["reasoning"],
+                    "single_product": decision["single_product"],
+                    "mentioned_product": decision["mentioned_product"]
+                })
+
+                if decision["is_ordering"] and decision["order_confidence"] >= 0.7:
                     print(
-                        f"LLM phát hiện ý định đặt hàng (độ tin cậy: {confidence}): {reasoning}")
+                        f"LLM phát hiện ý định đặt hàng (độ tin cậy: {decision['order_confidence']}): {decision['reasoning']}")
                     return "order_processor"
-            except Exception as e:
-                print(f"Lỗi khi phát hiện ý định đặt hàng: {e}")
+                intent_result = decision
 
         if any(keyword in user_query.lower() for keyword in order_keywords) and recently_advised_products:
             print("Phát hiện từ khóa đặt hàng khi có sản phẩm tư vấn gần đây")
             return "order_processor"
 
-        intent_result = await self.classify_intent(user_query)
+        if intent_result is None:
+            intent_result = await self.classify_intent(user_query)
         print("intent_result", intent_result)
 
         intent = intent_result.get("intent", "general")
@@ -1,13 +1,15 @@
 from agents import Agent, Runner, FunctionTool, OpenAIChatCompletionsModel, function_tool
-from openai import AsyncOpenAI
-from src.config import OPENAI_MODEL, OPENAI_API_KEY
+from src.services.resource_registry import get_async_openai_client
+from src.config import OPENAI_MODEL
+from src.services.stage_timer import stage
+from src.services.streaming import run_agent
 
 
 class GeneralAdvisorAgent:
     def __init__(self):
         self.model_client = OpenAIChatCompletionsModel(
             model=OPENAI_MODEL,
-            openai_client=AsyncOpenAI(api_key=OPENAI_API_KEY)
+            openai_client=get_async_openai_client()
         )
 
         self.agent = Agent(
@@ -59,15 +61,16 @@ class GeneralAdvisorAgent:
             hỏi cụ thể hơn để được kết nối với chuyên gia phù hợp.
             """
 
-            response = await Runner.run(
-                self.agent,
-                [
-                    {"role": "system", "content": self.agent.instructions},
-                    {"role": "user", "content": prompt}
-                ],
-            )
+            with stage("generate"):
+                final_output = await run_agent(
+                    self.agent,
+                    [
+                        {"role": "system", "content": self.agent.instructions},
+                        {"role": "user", "content": prompt}
+                    ],
+                )
 
-            return response.final_output
+            return final_output
 
         except Exception as e:
             print(f"Error in GeneralAdvisorAgent.handle_query: {e}")
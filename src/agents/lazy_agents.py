@@ -0,0 +1,55 @@
+import threading
+from src.services.startup_report import startup_report
+
+# Agent type -> (module, class). Modules, and the agents SDK, chromadb and
+# openai behind them, are only imported when the router first picks the agent
+AGENT_CLASSES = {
+    "product_advisor": ("src.agents.product_advisor", "ProductAdvisorAgent"),
+    "policy_advisor": ("src.agents.policy_advisor", "PolicyAdvisorAgent"),
+    "pc_builder": ("src.agents.pc_builder", "PCBuilderAgent"),
+    "order_processor": ("src.agents.order_processor", "OrderProcessorAgent"),
+    "general": ("src.agents.general_advisor", "GeneralAdvisorAgent"),
+}
+
+
+def load_agent_class(agent_type):
+    module_name, class_name = AGENT_CLASSES[agent_type]
+    return getattr(startup_report.import_module(module_name), class_name)
+
+
+def create_router():
+    module = startup_report.import_module("src.agents.agent_router")
+    return module.AgentRouter()
+
+
+class LazyAgents:
+    """The agent set of one session, each agent built on first get()."""
+
+    def __init__(self):
+        self._agents = {}
+        self._lock = threading.Lock()
+
+    def get(self, agent_type, default=None):
+        if agent_type not in AGENT_CLASSES:
+            return default
+
+        agent = self._agents.get(agent_type)
+        if agent is None:
+            with self._lock:
+                agent = self._agents.get(agent_type)
+                if agent is None:
+                    agent = load_agent_class(agent_type)()
+                    self._agents[agent_type] = agent
+        return agent
+
+    def __getitem__(self, agent_type):
+        agent = self.get(agent_type)
+        if agent is None:
+            raise KeyError(agent_type)
+        return agent
+
+    def __contains__(self, agent_type):
+        return agent_type in AGENT_CLASSES
+
+    def built(self):
+        return list(self._agents)
@@ -1,6 +1,7 @@
 from agents import Agent, Runner, FunctionTool, OpenAIChatCompletionsModel, function_tool
-from openai import AsyncOpenAI
-from src.config import OPENAI_MODEL, OPENAI_API_KEY
+from src.services.resource_registry import get_async_openai_client
+from src.config import OPENAI_MODEL
+from src.services.stage_timer import stage
 from src.services.shared_state import SharedStateService
 from src.services.price_utils import format_price_usd_to_vnd
 import re
@@ -14,7 +15,7 @@ class OrderProcessorAgent:
     def __init__(self):
         self.model_client = OpenAIChatCompletionsModel(
             model=OPENAI_MODEL,
-            openai_client=AsyncOpenAI(api_key=OPENAI_API_KEY)
+            openai_client=get_async_openai_client()
         )
 
         self.shared_state = SharedStateService()
@@ -52,6 +53,12 @@ class OrderProcessorAgent:
             """,
         )
 
+        self.order_intent_detector = Agent(
+            name="OrderIntentDetector",
+            model=self.model_client,
+            instructions="Xác định ý định đặt hàng từ văn bản đầu vào"
+        )
+
         self.orders = {}
 
         # Payment methods
@@ -85,6 +92,12 @@ class OrderProcessorAgent:
             if not recently_advised_products:
                 return False, 0.0, "Không có sản phẩm tư vấn gần đây"
 
+            # AgentRouter.route_with_context already answered for this message
+            routed = self.shared_state.get_session_data("order_intent")
+            if routed and routed.get("query") == query:
+                return (routed["is_ordering"], routed["confidence"], routed["reasoning"],
+                        routed["single_product"], routed["mentioned_product"])
+
             product_list = ""
             for product in recently_advised_products:
                 product_list += f"- {product.get('name', 'Unknown')} ({product.get('category', 'Unknown')})\n"
@@ -116,14 +129,11 @@ class OrderProcessorAgent:
             }}
             """
 
-            response = await Runner.run(
-                Agent(
-                    name="OrderIntentDetector",
-                    model=self.model_client,
-                    instructions="Xác định ý định đặt hàng từ văn bản đầu vào"
-                ),
-                [{"role": "user", "content": prompt}]
-            )
+            with stage("order_intent"):
+                response = await Runner.run(
+                    self.order_intent_detector,
+                    [{"role": "user", "content": prompt}]
+                )
 
             try:
                 result_text = response.final_output
@@ -214,14 +224,15 @@ class OrderProcessorAgent:
             Chỉ trả về đối tượng JSON, không cần thêm giải thích.
             """
 
-            response = await Runner.run(
-                Agent(
-                    name="ProductExtractor",
-                    model=self.model_client,
-                    instructions="Trích xuất tên sản phẩm từ văn bản và dữ liệu sản phẩm đã tư vấn"
-                ),
-                [{"role": "user", "content": prompt}]
-            )
+            with stage("extract"):
+                response = await Runner.run(
+                    Agent(
+                        name="ProductExtractor",
+                        model=self.model_client,
+                        instructions="Trích xuất tên sản phẩm từ văn bản và dữ liệu sản phẩm đã tư vấn"
+                    ),
+                    [{"role": "user", "content": prompt}]
+                )
 
             try:
                 raw_text = response.final_output
@@ -1,21 +1,30 @@
-from src.database.chroma import ChromaDB
-from src.services.enhance_search import EnhancedSearchService
-from src.services.vietnamese_llm_helper import VietnameseLLMHelper
 from src.services.shared_state import SharedStateService
 from agents import Agent, Runner, FunctionTool, OpenAIChatCompletionsModel, function_tool
-from openai import AsyncOpenAI
-from src.config import OPENAI_MODEL, OPENAI_API_KEY
+from src.services.resource_registry import registry, get_async_openai_client, get_search_service, get_vi_helper
+from src.config import (OPENAI_MODEL, PC_BUILDER_PARALLEL_SEARCH, PC_BUILDER_OPTIMIZER, PC_BUILDER_EDITS,
+                        PC_BUILDER_SEARCH_CONCURRENCY, PC_BUILDER_SEARCH_TIMEOUT)
+from src.services.stage_timer import stage
+from src.services.streaming import run_agent, send_text
+from src.services.build_editor import parse_build_edit, replace_sections, split_sections
+from src.services.query_filters import build_where
+from src.services.price_utils import parse_usd_from_vnd, format_price_usd_to_vnd
+import asyncio
 import re
 
 
 class PCBuilderAgent:
-    def __init__(self):
-        self.vi_helper = VietnameseLLMHelper()
-        self.search_service = EnhancedSearchService()
+    def __init__(self, parallel_search=PC_BUILDER_PARALLEL_SEARCH,
+                 search_concurrency=PC_BUILDER_SEARCH_CONCURRENCY,
+                 search_timeout=PC_BUILDER_SEARCH_TIMEOUT):
+        self.parallel_search = parallel_search
+        self.search_concurrency = search_concurrency
+        self.search_timeout = search_timeout
+        self.vi_helper = get_vi_helper()
+        self.search_service = get_search_service()
         self.shared_state = SharedStateService()
         self.model_client = OpenAIChatCompletionsModel(
             model=OPENAI_MODEL,
-            openai_client=AsyncOpenAI(api_key=OPENAI_API_KEY)
+            openai_client=get_async_openai_client()
         )
 
         self.pc_purposes = {
@@ -27,6 +36,12 @@ class PCBuilderAgent:
             "general": "Đa năng"
         }
 
+        self.edit_directions = {
+            "cheaper": "rẻ hơn",
+            "better": "mạnh hơn",
+            "other": "khác"
+        }
+
         self.agent = Agent(
             name="PCBuilder",
             model=self.model_client,
@@ -130,19 +145,31 @@ class PCBuilderAgent:
             filter_dict = {"category": category}
 
             if budget_hint:
-                from src.services.price_utils import convert_usd_to_vnd
-                budget_usd = budget_hint / 25000
+                budget_usd = parse_usd_from_vnd(budget_hint)
                 enhanced_query = f"{search_query} price range {budget_usd}"
+                # Keep parts well over the category budget out of the top-k
+                filter_dict = build_where(
+                    category, max_price=budget_usd * 1.3)
             else:
                 enhanced_query = search_query
 
-            search_results = self.search_service.search(
+            search_results = await self.search_service.search_async(
                 enhanced_query,
                 language="vi",
                 n_results=n_results,
                 filters=filter_dict
             )
 
+            if budget_hint and not (search_results and search_results.get('documents') and search_results['documents'][0]):
+                print(
+                    f"No {category} within the category budget, searching without the price cap")
+                search_results = await self.search_service.search_async(
+                    enhanced_query,
+                    language="vi",
+                    n_results=n_results,
+                    filters={"category": category}
+                )
+
             formatted_results = []
             if search_results and 'documents' in search_results and search_results['documents'][0]:
                 for i, doc in enumerate(search_results['documents'][0]):
@@ -175,9 +202,227 @@ class PCBuilderAgent:
             print(f"Error searching components: {e}")
             return []
 
+    async def _search_all_components(self, category_searches):
+        if not self.parallel_search:
+            component_searches = {}
+            for category, (search_query, category_budget) in category_searches.items():
+                component_searches[category] = await self.search_components(
+                    category, search_query, category_budget, n_results=3)
+            return component_searches
+
+        semaphore = asyncio.Semaphore(self.search_concurrency)
+
+        async def search_category(category, search_query, category_budget):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(
+                        self.search_components(
+                            category, search_query, category_budget, n_results=3),
+                        timeout=self.search_timeout
+                    )
+                except asyncio.TimeoutError:
+                    print(
+                        f"Component search for {category} timed out after {self.search_timeout}s")
+                    return []
+
+        categories = list(category_searches.keys())
+        results = await asyncio.gather(*[
+            search_category(category, search_query, category_budget)
+            for category, (search_query, category_budget) in category_searches.items()
+        ])
+
+        # Keep the original category order for the prompt, missing categories
+        # come back empty and the prompt already handles that
+        return dict(zip(categories, results))
+
+    async def optimize_build(self, budget, purposes):
+        """Return (build, candidates) from the Postgres catalog.
+
+        build is None when no compatible build fits the budget, in which case
+        the LLM picks the parts; the candidates (category -> BuildPart, best
+        first) still save searching those categories. Both are empty when
+        Postgres is unreachable.
+        """
+        if not PC_BUILDER_OPTIMIZER:
+            return None, {}
+        candidates = {}
+        try:
+            from src.services.build_optimizer import BuildOptimizer, load_build_candidates
+
+            budget_usd = parse_usd_from_vnd(budget)
+            with stage("optimize"):
+                candidates = await asyncio.to_thread(
+                    load_build_candidates, registry.get("postgres_pool"), budget_usd, purposes)
+                build = BuildOptimizer().optimize(
+                    candidates, budget_usd, purposes)
+            return build, candidates
+        except Exception as e:
+            print(f"Build optimizer unavailable, searching instead: {e}")
+            return None, candidates
+
+    def _components_from_candidates(self, candidates, n_results=3):
+        """Catalog candidates in the shape search_components() returns."""
+        components = {}
+        for category, parts in candidates.items():
+            components[category] = [{
+                "name": part.name,
+                "price": part.price,
+                "category": category,
+                "details": ", ".join(f"{key}: {value}" for key, value in part.specs.items())
+            } for part in parts[:n_results]]
+        return components
+
+    async def explain_build(self, query, build, budget_text, purpose_text):
+        build_text = ""
+        for part in build.parts.values():
+            if part is None:
+                continue
+            specs = ", ".join(f"{key}: {value}" for key,
+                              value in list(part.specs.items())[:8])
+            build_text += f"\n### {part.category}\n{part.name}\n- Giá: {format_price_usd_to_vnd(part.price)}\n  Thông số: {specs}\n"
+
+        prompt = f"""
+            Bạn là chuyên gia tư vấn cấu hình PC tại cửa hàng TechPlus. Một khách hàng đã yêu cầu: "{query}"
+            
+            - Ngân sách: {budget_text}
+            - Mục đích sử dụng chính: {purpose_text}
+            
+            Hệ thống đã chọn cấu hình dưới đây từ kho hàng, tối ưu theo mục đích sử dụng trong ngân sách và đã kiểm tra
+            tương thích (socket CPU và bo mạch chủ, loại RAM, công suất nguồn so với CPU và GPU):
+            {build_text}
+            Tổng chi phí: {format_price_usd_to_vnd(build.total_price)}
+            
+            Hãy giới thiệu cấu hình này cho khách hàng. KHÔNG thay đổi, thêm hay bớt linh kiện và giữ nguyên giá.
+            Với mỗi thành phần, giữ tiêu đề "### [Tên thành phần]", tên sản phẩm trên một dòng riêng, giá dạng "- Giá: XXX.XXXđ",
+            sau đó giải thích ngắn gọn vì sao linh kiện phù hợp với nhu cầu. Kết thúc bằng tổng chi phí.
+            """
+
+        with stage("generate"):
+            final_output = await run_agent(
+                self.agent,
+                [
+                    {"role": "system", "content": self.agent.instructions},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+
+        advised_products = build.products()
+        self.shared_state.set_recently_advised_products(advised_products)
+        print(f"Đã lưu {len(advised_products)} sản phẩm vào shared state")
+        self._store_build(build, split_sections(final_output),
+                          budget_text, purpose_text)
+        return final_output
+
+    def _store_build(self, build, sections, budget_text, purpose_text):
+        self.shared_state.set_session_data("pc_build", {
+            "build": build.to_dict(),
+            "sections": sections,
+            "budget_text": budget_text,
+            "purpose_text": purpose_text
+        })
+
+    async def _explain_part_change(self, query, category, old_part, new_part, direction, purpose_text):
+        direction_text = self.edit_directions[direction]
+        old_text = f"{old_part.name}, giá {format_price_usd_to_vnd(old_part.price)}" if old_part else "không có"
+        specs = ", ".join(f"{key}: {value}" for key,
+                          value in list(new_part.specs.items())[:8])
+        price_text = format_price_usd_to_vnd(new_part.price)
+
+        prompt = f"""
+            Khách hàng đang sửa cấu hình PC vừa được tư vấn và yêu cầu: "{query}"
+            
+            - Mục đích sử dụng chính: {purpose_text}
+            - {category} cũ: {old_text}
+            - {category} mới: {new_part.name}, giá {price_text}
+              Thông số: {specs}
+            
+            Hệ thống đã chọn {category} mới ({direction_text}) và đã kiểm tra tương thích với các linh kiện còn lại.
+            Hãy viết 2-3 câu ngắn gọn giải thích vì sao {category} mới phù hợp và khác gì so với {category} cũ.
+            KHÔNG viết tiêu đề, tên sản phẩm hay giá, chỉ viết phần giải thích.
+            """
+
+        # Not streamed: the section is spliced into the previous answer
+        with stage("generate"):
+            response = await Runner.run(
+                self.agent,
+                [
+                    {"role": "system", "content": self.agent.instructions},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+        return f"### {category}\n{new_part.name}\n- Giá: {price_text}\n{response.final_output.strip()}"
+
+    async def edit_build(self, query, stored, categories, direction):
+        """Swap only the named parts of the session's build and rewrite only
+        their sections of the previous answer. None to build from scratch."""
+        try:
+            from src.services.build_optimizer import (BuildOptimizer, PCBuild, load_build_candidates,
+                                                      replacement_band)
+
+            build = PCBuild.from_dict(stored["build"])
+            optimizer = BuildOptimizer()
+            replaced, kept = {}, []
+            with stage("optimize"):
+                for category in categories:
+                    candidates = await asyncio.to_thread(
+                        load_build_candidates, registry.get("postgres_pool"), build.budget, build.purposes,
+                        bands={category: replacement_band(build, category, direction)})
+                    new_build = optimizer.replace_part(
+                        build, category, candidates.get(category, []), direction)
+                    if new_build is None:
+                        kept.append(category)
+                        continue
+                    replaced[category] = build.parts.get(category)
+                    build = new_build
+        except Exception as e:
+            print(f"Không sửa được cấu hình, xây dựng lại từ đầu: {e}")
+            return None
+
+        direction_text = self.edit_directions[direction]
+        notes = []
+        for category in kept:
+            current = build.parts.get(category)
+            notes.append(f"Hiện không có {category} {direction_text} nào vừa ngân sách và tương thích với các linh kiện còn lại"
+                         + (f", nên giữ nguyên {current.name}." if current else "."))
+        if not replaced:
+            answer = "\n".join(notes)
+            await send_text(answer)
+            return answer
+
+        sections = await asyncio.gather(*[
+            self._explain_part_change(query, category, old_part, build.parts[category],
+                                      direction, stored["purpose_text"])
+            for category, old_part in replaced.items()
+        ])
+        sections = replace_sections(
+            stored["sections"], dict(zip(replaced, sections)))
+
+        for category, old_part in replaced.items():
+            new_part = build.parts[category]
+            notes.insert(0, f"Đã đổi {category}: {old_part.name if old_part else 'không có'} → {new_part.name} "
+                            f"({format_price_usd_to_vnd(new_part.price)}).")
+        answer = "\n".join(notes) + "\n\n" + "\n\n".join(text for _, text in sections) + \
+            f"\n\n**Tổng chi phí: {format_price_usd_to_vnd(build.total_price)}**"
+
+        advised_products = build.products()
+        self.shared_state.set_recently_advised_products(advised_products)
+        self._store_build(build, sections,
+                          stored["budget_text"], stored["purpose_text"])
+        await send_text(answer)
+        return answer
+
     async def handle_query(self, query: str, language: str = "vi"):
         try:
             budget = self._extract_budget(query)
+
+            # "Đổi GPU sang loại rẻ hơn": change the build just advised
+            stored_build = self.shared_state.get_session_data(
+                "pc_build") if PC_BUILDER_EDITS else None
+            edit = parse_build_edit(query) if stored_build and not budget else None
+            if edit:
+                answer = await self.edit_build(query, stored_build, *edit)
+                if answer is not None:
+                    return answer
             purposes = self._extract_purpose(query)
 
             if not budget:
@@ -189,7 +434,13 @@ class PCBuilderAgent:
             purpose_text = ", ".join([self.pc_purposes[p]
                                       for p in purposes if p in self.pc_purposes])
 
-            enhanced_query = self.vi_helper.enhance_vietnamese_query(query)
+            # A new build replaces the stored one; builds the LLM picked
+            # below have no structured parts to edit
+            if stored_build:
+                self.shared_state.set_session_data("pc_build", None)
+            build, candidates = await self.optimize_build(budget, purposes)
+            if build is not None:
+                return await self.explain_build(query, build, budget_text, purpose_text)
 
             prompt = f"""
             Bạn là chuyên gia tư vấn cấu hình PC tại cửa hàng TechPlus. Một khách hàng đã yêu cầu: "{query}"
@@ -238,7 +489,7 @@ class PCBuilderAgent:
             component_categories = [
                 "CPU", "Motherboard", "RAM", "GPU", "Storage", "PSU", "Case", "Cooling"]
 
-            component_searches = {}
+            category_searches = {}
 
             for category in component_categories:
                 purpose_keywords = " ".join(
@@ -266,8 +517,16 @@ class PCBuilderAgent:
                     elif category == "Cooling":
                         category_budget = budget * 0.02
 
-                components = await self.search_components(category, search_query, category_budget, n_results=3)
-                component_searches[category] = components
+                category_searches[category] = (search_query, category_budget)
+
+            # Categories the catalog query already answered are not searched
+            component_searches = self._components_from_candidates(candidates)
+            category_searches = {category: search for category, search in category_searches.items()
+                                 if not component_searches.get(category)}
+            if category_searches:
+                component_searches.update(await self._search_all_components(category_searches))
+            component_searches = {category: component_searches.get(category, [])
+                                  for category in component_categories}
 
             prompt += "\n\nKết quả tìm kiếm trong cơ sở dữ liệu của chúng ta:\n"
 
@@ -298,15 +557,16 @@ class PCBuilderAgent:
             và giá sản phẩm dạng "- Giá: XXX.XXXđ" trên dòng tiếp theo.
             """
 
-            response = await Runner.run(
-                self.agent,
-                [
-                    {"role": "system", "content": self.agent.instructions},
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            with stage("generate"):
+                final_output = await run_agent(
+                    self.agent,
+                    [
+                        {"role": "system", "content": self.agent.instructions},
+                        {"role": "user", "content": prompt}
+                    ]
+                )
 
-            final_response = response.final_output
+            final_response = final_output
             advised_products = []
             section_pattern = r'### (CPU|Motherboard|RAM|GPU|Storage|PSU|Case|Cooling)[\s\S]*?(?=### |\Z)'
             sections = re.findall(section_pattern, final_response)
@@ -1,15 +1,16 @@
-from src.services.policy_search import PolicySearchService
 from agents import Agent, Runner, FunctionTool, OpenAIChatCompletionsModel, function_tool
-from openai import AsyncOpenAI
-from src.config import OPENAI_MODEL, OPENAI_API_KEY
+from src.services.resource_registry import get_async_openai_client, get_policy_search_service
+from src.config import OPENAI_MODEL
+from src.services.stage_timer import stage
+from src.services.streaming import run_agent
 
 
 class PolicyAdvisorAgent:
     def __init__(self):
-        self.policy_search = PolicySearchService()
+        self.policy_search = get_policy_search_service()
         self.model_client = OpenAIChatCompletionsModel(
             model=OPENAI_MODEL,
-            openai_client=AsyncOpenAI(api_key=OPENAI_API_KEY)
+            openai_client=get_async_openai_client()
         )
 
         # Create agent using OpenAI Agent SDK
@@ -38,12 +39,12 @@ class PolicyAdvisorAgent:
         )
 
     async def search_policy(self, query: str, language: str = "vi", n_results: int = 2):
-        search_results = self.policy_search.search_policy(
+        search_results = await self.policy_search.search_policy_async(
             query, language, n_results)
         return search_results
 
     async def format_policy_response(self, search_results):
-        return self.policy_search.format_policy_response(search_results)
+        return await self.policy_search.format_policy_response_async(search_results)
 
     async def handle_query(self, query: str, language: str = "vi"):
         try:
@@ -97,15 +98,16 @@ class PolicyAdvisorAgent:
             """
 
             # Step 5: Generate response using the agent
-            response = await Runner.run(
-                self.agent,
-                [
-                    {"role": "system", "content": self.agent.instructions},
-                    {"role": "user", "content": prompt}
-                ],
-            )
+            with stage("generate"):
+                final_output = await run_agent(
+                    self.agent,
+                    [
+                        {"role": "system", "content": self.agent.instructions},
+                        {"role": "user", "content": prompt}
+                    ],
+                )
 
-            return response.final_output
+            return final_output
 
         except Exception as e:
             print(f"Error in PolicyAdvisorAgent.handle_query: {e}")
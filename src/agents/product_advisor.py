@@ -1,20 +1,20 @@
-from src.database.chroma import ChromaDB
-from src.services.enhance_search import EnhancedSearchService
-from src.services.vietnamese_llm_helper import VietnameseLLMHelper
 from src.services.shared_state import SharedStateService
 from agents import Agent, Runner, FunctionTool, OpenAIChatCompletionsModel, function_tool
-from openai import AsyncOpenAI
-from src.config import OPENAI_MODEL, OPENAI_API_KEY
+from src.services.resource_registry import get_async_openai_client, get_search_service, get_vi_helper
+from src.config import OPENAI_MODEL
+from src.services.stage_timer import stage
+from src.services.streaming import run_agent
+from src.services.query_filters import parse_query_filters
 
 
 class ProductAdvisorAgent:
     def __init__(self):
-        self.vi_helper = VietnameseLLMHelper()
-        self.search_service = EnhancedSearchService()
+        self.vi_helper = get_vi_helper()
+        self.search_service = get_search_service()
         self.shared_state = SharedStateService()
         self.model_client = OpenAIChatCompletionsModel(
             model=OPENAI_MODEL,
-            openai_client=AsyncOpenAI(api_key=OPENAI_API_KEY)
+            openai_client=get_async_openai_client()
         )
 
         # Create agent using OpenAI Agent SDK
@@ -38,7 +38,17 @@ class ProductAdvisorAgent:
         )
 
     async def search_products(self, query: str, language: str = "vi", n_results: int = 3):
-        return self.search_service.search(query, language, n_results)
+        query_filters = parse_query_filters(query)
+        filters = query_filters.to_where()
+        if filters:
+            print(f"Query filters: {query_filters}")
+            search_results = await self.search_service.search_async(
+                query, language, n_results, filters=filters)
+            if search_results and search_results.get('documents') and search_results['documents'][0]:
+                return search_results
+            print("No products match the query filters, searching without them")
+
+        return await self.search_service.search_async(query, language, n_results)
 
     async def handle_query(self, query: str, language: str = "vi"):
         try:
@@ -122,15 +132,16 @@ class ProductAdvisorAgent:
             """
 
             # Step 5: Generate response using the agent
-            response = await Runner.run(
-                self.agent,
-                [
-                    {"role": "system", "content": self.agent.instructions},
-                    {"role": "user", "content": prompt}
-                ],
-            )
-
-            return response.final_output
+            with stage("generate"):
+                final_output = await run_agent(
+                    self.agent,
+                    [
+                        {"role": "system", "content": self.agent.instructions},
+                        {"role": "user", "content": prompt}
+                    ],
+                )
+
+            return final_output
 
         except Exception as e:
             print(f"Error in ProductAdvisorAgent.handle_query: {e}")
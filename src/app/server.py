@@ -0,0 +1,333 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from src.agents.lazy_agents import LazyAgents, create_router
+from src.config import SERVER_SESSION_TTL, SERVER_MAX_SESSIONS
+from src.services.query_embedding import request_embedding_scope
+from src.services.session_state import session_scope
+from src.services.shared_state import SharedStateService
+from src.services.startup_report import startup_report
+from src.services.speculation import speculative_prework
+from src.services.streaming import stream_to
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    language: str = "vi"
+
+
+class OrderRequest(BaseModel):
+    session_id: str
+    customer_name: str
+    customer_phone: str
+    customer_address: str
+
+
+class ChatSession:
+    """Router and agents of one conversation.
+
+    Conversation state (advised products, pending order) lives in the session
+    state store, so with a shared backend any worker can continue a session.
+    Turns of the same session run one at a time; different sessions run
+    concurrently on the server's event loop.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.agents = LazyAgents()
+        self.shared_state = SharedStateService()
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+        self._router = None
+
+    @property
+    def router(self):
+        if self._router is None:
+            self._router = create_router()
+        return self._router
+
+    @property
+    def pending_order_products(self):
+        with session_scope(self.session_id):
+            return self.shared_state.get_session_data("pending_order_products")
+
+    @pending_order_products.setter
+    def pending_order_products(self, products):
+        with session_scope(self.session_id):
+            self.shared_state.set_session_data(
+                "pending_order_products", products)
+
+    async def answer(self, query, language="vi", on_delta=None):
+        async with self.lock:
+            with session_scope(self.session_id), request_embedding_scope(), stream_to(on_delta):
+                async with speculative_prework(query, language) as speculation:
+                    agent_type = await self.router.route_query(query)
+                    if speculation is not None:
+                        speculation.keep_for(agent_type)
+                    agent = self.agents.get(
+                        agent_type) or self.agents.get("general")
+                    response = await agent.handle_query(query, language)
+
+                if agent_type in ["product_advisor", "pc_builder"] and hasattr(agent, "recently_advised_products"):
+                    self.router.set_recently_advised_products(
+                        agent.recently_advised_products)
+
+            show_order_form = isinstance(
+                response, dict) and "show_order_form" in response
+            if show_order_form:
+                self.pending_order_products = response.get("products", [])
+
+        result = {
+            "session_id": self.session_id,
+            "agent": agent.agent.name,
+            "content": response,
+            "show_order_form": False
+        }
+        if show_order_form:
+            products = response.get("products", [])
+            result["content"] = response["content"]
+            result["show_order_form"] = True
+            result["products"] = products
+
+        startup_report.mark_first_response()
+        return result
+
+
+class SessionManager:
+    def __init__(self, ttl_seconds=1800, max_sessions=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        # Least recently used first, so eviction only looks at the front
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id=None, create=True):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                if not create:
+                    return None
+                session = ChatSession(session_id or str(uuid.uuid4()))
+                self._sessions[session.session_id] = session
+            else:
+                self._sessions.move_to_end(session.session_id)
+            session.last_used = now
+            return session
+
+    def _evict(self, now):
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl_seconds and len(self._sessions) < self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def warm_resources():
+    """Build the shared resources a first message would otherwise pay for."""
+    from src.services.resource_registry import registry
+    from src.services.local_query_expander import get_local_expander
+    from src.agents.lazy_agents import AGENT_CLASSES, load_agent_class
+
+    checks = {}
+    for name in ["async_openai_client", "chroma_products", "chroma_policies",
+                 "search_service", "policy_search_service"]:
+        registry.get(name)
+        checks[name] = "ok"
+
+    get_local_expander()
+    checks["local_expander"] = "ok"
+
+    from src.services.intent_classifier import get_intent_classifier
+    get_intent_classifier()
+    checks["intent_classifier"] = "ok"
+
+    startup_report.import_module("src.agents.agent_router")
+    for agent_type in AGENT_CLASSES:
+        load_agent_class(agent_type)
+    checks["agents"] = "ok"
+
+    # The chat path does not need Postgres, so it is reported, not required
+    try:
+        registry.get("postgres_pool").query("SELECT 1", fetch="one")
+        checks["postgres"] = "ok"
+    except Exception as e:
+        checks["postgres"] = f"unavailable: {e}"
+    return checks
+
+
+class Readiness:
+    """Background warm-up behind /ready.
+
+    A failed warm-up is retried by the next start() once its backoff has
+    passed (doubling up to retry_max seconds), so the server becomes ready
+    when Chroma or the other resources come back.
+    """
+
+    def __init__(self, retry_initial=1.0, retry_max=60.0):
+        self.checks = None
+        self.error = None
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self._retry_delay = retry_initial
+        self._failed_at = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._should_retry():
+            self.error = None
+            self._task = asyncio.create_task(self._warm())
+        return self._task
+
+    def _should_retry(self):
+        return (self._task.done() and self.error is not None
+                and time.monotonic() - self._failed_at >= self._retry_delay)
+
+    @property
+    def retry_in(self):
+        if self.error is None:
+            return None
+        return max(0.0, self._failed_at + self._retry_delay - time.monotonic())
+
+    async def _warm(self):
+        try:
+            self.checks = await asyncio.to_thread(warm_resources)
+            self._retry_delay = self.retry_initial
+            print("Server resources warmed up")
+        except Exception as e:
+            if self._failed_at is not None:
+                self._retry_delay = min(self._retry_delay * 2, self.retry_max)
+            self._failed_at = time.monotonic()
+            self.error = str(e)
+            print(f"Error warming up resources, retrying in {self._retry_delay:.0f}s: {e}")
+
+    @property
+    def ready(self):
+        return self.checks is not None
+
+
+sessions = SessionManager(SERVER_SESSION_TTL, SERVER_MAX_SESSIONS)
+readiness = Readiness()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so /health answers while models load
+    readiness.start()
+    yield
+    from src.services.resource_registry import registry
+    from src.services.query_cache import close_caches
+    await registry.aclose()
+    close_caches()
+
+
+app = FastAPI(title="TechPlus Hardware Advisor", lifespan=lifespan)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="message is empty")
+
+    session = sessions.get(request.session_id)
+    try:
+        return await session.answer(request.message, request.language)
+    except Exception as e:
+        print(f"Error answering chat message: {e}")
+        raise HTTPException(
+            status_code=500, detail="Xin lỗi, tôi gặp lỗi khi xử lý câu hỏi của bạn")
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="message is empty")
+
+    session = sessions.get(request.session_id)
+
+    async def events():
+        deltas = asyncio.Queue()
+        done = object()
+
+        async def run():
+            try:
+                return await session.answer(request.message, request.language, on_delta=deltas.put_nowait)
+            finally:
+                deltas.put_nowait(done)
+
+        task = asyncio.create_task(run())
+        try:
+            yield _sse("session", {"session_id": session.session_id})
+            while True:
+                delta = await deltas.get()
+                if delta is done:
+                    break
+                yield _sse("delta", {"text": delta})
+
+            try:
+                yield _sse("done", await task)
+            except Exception as e:
+                print(f"Error answering chat message: {e}")
+                yield _sse("error", {"detail": "Xin lỗi, tôi gặp lỗi khi xử lý câu hỏi của bạn"})
+        finally:
+            # The client went away before the answer finished
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/orders")
+async def create_order(request: OrderRequest):
+    # The session may have been started on another worker; its pending
+    # order is in the shared session state store
+    session = sessions.get(request.session_id)
+    # Not while a /chat turn of this session may replace the pending order
+    async with session.lock:
+        pending_order_products = session.pending_order_products
+        if not pending_order_products:
+            raise HTTPException(
+                status_code=404, detail="No pending order for this session")
+
+        order_processor = session.agents.get("order_processor")
+        order_result = await asyncio.to_thread(
+            order_processor.create_order_from_form,
+            request.model_dump(exclude={"session_id"}),
+            pending_order_products
+        )
+        session.pending_order_products = None
+    return order_result
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "sessions": len(sessions)}
+
+
+@app.get("/ready")
+async def ready():
+    readiness.start()
+    if readiness.error is not None:
+        return JSONResponse(status_code=503, content={"status": "error", "detail": readiness.error,
+                                                      "retry_in": round(readiness.retry_in, 1)})
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content={"status": "warming"})
+    return {"status": "ready", "checks": readiness.checks, "startup": startup_report.lines()}
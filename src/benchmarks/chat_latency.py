@@ -0,0 +1,335 @@
+"""Offline end-to-end latency benchmark for the chat path.
+
+Runs AgentRouter.route_query followed by the chosen agent's handle_query
+against a local fake OpenAI server and a throwaway Chroma store, then reports
+p50/p95/p99 per stage and per agent.
+
+    python -m src.benchmarks.chat_latency --iterations 5 \\
+        --chat-latency 800:2500 --embedding-latency 150:400 --json bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src.benchmarks.fake_openai import FakeOpenAIServer, LatencyDistribution, PC_COMPONENTS
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))
+POLICY_FILE = os.path.join(PROJECT_ROOT, "src", "resources", "policy.txt")
+
+DEFAULT_QUERIES = [
+    "Xin chào",
+    "Cửa hàng mở cửa lúc mấy giờ?",
+    "CPU Intel nào phù hợp với ngân sách 5 triệu",
+    "card đồ họa dưới 5 triệu chơi game",
+    "So sánh card RTX 4060 và RX 7600",
+    "RAM DDR5 32GB tốt nhất",
+    "Chính sách bảo hành là gì",
+    "Làm thế nào để đổi trả sản phẩm",
+    "Có hỗ trợ trả góp không",
+    "Xây dựng cấu hình PC gaming 25 triệu",
+    "Tư vấn cấu hình PC đồ họa 30tr",
+]
+
+STAGES = ["route", "order_intent", "optimize", "enhance", "embed",
+          "ann", "rerank", "extract", "generate"]
+
+BRANDS = {
+    "CPU": ["Intel", "AMD"],
+    "Motherboard": ["ASUS", "Gigabyte", "MSI", "ASRock"],
+    "RAM": ["Corsair", "Kingston", "G.Skill"],
+    "GPU": ["NVIDIA", "AMD", "ASUS", "MSI"],
+    "Storage": ["Samsung", "Western Digital", "Crucial"],
+    "PSU": ["Corsair", "Seasonic", "Cooler Master"],
+    "Case": ["NZXT", "Lian Li", "Fractal Design"],
+    "Cooling": ["Noctua", "Deepcool", "Arctic"],
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+    }
+
+
+def synthetic_product(category, index, rng):
+    brand = rng.choice(BRANDS[category])
+    specs = {"tier": rng.choice(["entry", "mainstream", "high-end"])}
+    if category == "CPU":
+        cores = rng.choice([6, 8, 12, 16])
+        specs.update({"socket": rng.choice(["AM5", "LGA1700"]),
+                     "cores": cores, "threads": cores * 2, "tdp": rng.choice([65, 105, 125])})
+    elif category == "GPU":
+        specs.update({"memory": rng.choice(
+            [8, 12, 16]), "tdp": rng.choice([115, 200, 285])})
+    elif category == "Storage":
+        specs.update({"capacity": rng.choice(["500GB", "1TB", "2TB"])})
+    elif category == "Motherboard":
+        specs.update({"socket": rng.choice(["AM5", "LGA1700"]),
+                     "memory_type": rng.choice(["DDR4", "DDR5"])})
+
+    model = f"{category[:3].upper()}-{index:04d}"
+    return {
+        "name": f"{brand} {category} {model}",
+        "brand": brand,
+        "model": model,
+        "price": round(rng.uniform(30, 900), 2),
+        "specs": specs,
+        "stock": rng.randint(5, 30),
+    }
+
+
+def seed_catalog(products_per_category, rng):
+    from src.database.chroma import ChromaDB
+    from src.services.policy_embedding import PolicyEmbeddingService
+
+    products_db = ChromaDB().connect(collection_name="computer_parts")
+    items = []
+    for category in PC_COMPONENTS:
+        for index in range(products_per_category):
+            product = synthetic_product(category, index, rng)
+            specs_text = ". ".join(
+                f"{key}: {value}" for key, value in product["specs"].items())
+            items.append((len(items) + 1, product, category, specs_text))
+    products_db.add_products(items)
+
+    policies_db = ChromaDB().connect(collection_name="policies")
+    PolicyEmbeddingService(policies_db).process_policy_file(POLICY_FILE)
+
+
+def build_agents():
+    from src.agents.agent_router import AgentRouter
+    from src.agents.product_advisor import ProductAdvisorAgent
+    from src.agents.policy_advisor import PolicyAdvisorAgent
+    from src.agents.pc_builder import PCBuilderAgent
+    from src.agents.order_processor import OrderProcessorAgent
+    from src.agents.general_advisor import GeneralAdvisorAgent
+
+    router = AgentRouter()
+    agents = {
+        "product_advisor": ProductAdvisorAgent(),
+        "policy_advisor": PolicyAdvisorAgent(),
+        "pc_builder": PCBuilderAgent(),
+        "order_processor": OrderProcessorAgent(),
+        "general": GeneralAdvisorAgent(),
+    }
+    return router, agents
+
+
+async def run_query(router, agents, query, stream=False):
+    from contextlib import nullcontext
+    from src.services.stage_timer import record_stages
+    from src.services.query_embedding import request_embedding_scope
+    from src.services.speculation import speculative_prework
+    from src.services.streaming import stream_to
+
+    first_token = []
+
+    def on_delta(delta):
+        if delta and not first_token:
+            first_token.append(time.perf_counter())
+
+    streaming = stream_to(on_delta) if stream else nullcontext()
+    with record_stages() as recorder, request_embedding_scope(), streaming:
+        start = time.perf_counter()
+        async with speculative_prework(query, "vi") as speculation:
+            agent_type = await router.route_query(query)
+            if speculation is not None:
+                speculation.keep_for(agent_type)
+            agent = agents.get(agent_type) or agents["general"]
+            await agent.handle_query(query, "vi")
+        total = time.perf_counter() - start
+
+    ttft = first_token[0] - start if first_token else None
+    return agent_type, total, ttft, recorder.totals()
+
+
+async def run_benchmark(queries, iterations, warmup, stream=False, conversation=False):
+    from src.services.shared_state import SharedStateService
+
+    router, agents = build_agents()
+    shared_state = SharedStateService()
+
+    stage_samples = {}
+    agent_samples = {}
+    total_samples = []
+    ttft_samples = []
+
+    for iteration in range(warmup + iterations):
+        for query in queries:
+            # Every query starts a fresh conversation so routing stays
+            # comparable, unless follow-up turns are what is measured
+            if not conversation:
+                shared_state.init_state()
+            agent_type, total, ttft, stage_totals = await run_query(
+                router, agents, query, stream)
+            if iteration < warmup:
+                continue
+
+            total_samples.append(total)
+            if ttft is not None:
+                ttft_samples.append(ttft)
+            agent_samples.setdefault(agent_type, []).append(total)
+            for name, seconds in stage_totals.items():
+                stage_samples.setdefault(name, []).append(seconds)
+
+    from src.services.query_cache import get_enhancement_cache
+    from src.services.resource_registry import get_reranker
+    from src.services.embedding_cache import get_embedding_store
+
+    report = {
+        "caches": {
+            "query_enhancement": get_enhancement_cache().stats(),
+            "rerank": get_reranker().cache.stats(),
+            **({"embedding": get_embedding_store().stats()} if get_embedding_store() else {})
+        },
+        "total": summarize(total_samples),
+        "stages": {name: summarize(values) for name, values in sorted(
+            stage_samples.items(), key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else len(STAGES))},
+        "agents": {name: summarize(values) for name, values in sorted(agent_samples.items())},
+    }
+    if stream:
+        report["time_to_first_token"] = summarize(ttft_samples)
+    return report
+
+
+def format_report(report, server):
+    lines = []
+    header = f"{'':<18}{'count':>7}{'mean':>11}{'p50':>11}{'p95':>11}{'p99':>11}"
+
+    def row(label, stats):
+        return (f"{label:<18}{stats['count']:>7}{stats['mean_ms']:>9.1f}ms"
+                f"{stats['p50_ms']:>9.1f}ms{stats['p95_ms']:>9.1f}ms{stats['p99_ms']:>9.1f}ms")
+
+    lines.append("Per stage (self time per query)")
+    lines.append(header)
+    for name, stats in report["stages"].items():
+        lines.append(row(name, stats))
+
+    lines.append("")
+    lines.append("Per agent (end-to-end per query)")
+    lines.append(header)
+    for name, stats in report["agents"].items():
+        lines.append(row(name, stats))
+    lines.append(row("all", report["total"]))
+    if "time_to_first_token" in report:
+        lines.append(row("first token", report["time_to_first_token"]))
+
+    lines.append("")
+    for name, stats in report.get("caches", {}).items():
+        lines.append(
+            f"{name} cache: {stats['hits']} hits, {stats['misses']} misses")
+    lines.append(
+        f"Fake OpenAI requests: {server.request_counts['chat']} chat, {server.request_counts['embeddings']} embeddings")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline latency benchmark for the TechPlus chat path")
+    parser.add_argument("--iterations", type=int, default=3,
+                        help="Measured passes over the query set")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="Unmeasured passes before measuring")
+    parser.add_argument("--chat-latency", default="800:2500",
+                        help="Chat completion latency as median_ms[:p95_ms]")
+    parser.add_argument("--embedding-latency", default="150:400",
+                        help="Embedding latency as median_ms[:p95_ms]")
+    parser.add_argument("--products-per-category", type=int, default=20,
+                        help="Synthetic products seeded into the throwaway Chroma store")
+    parser.add_argument("--queries",
+                        help="File with one query per line (default: built-in set)")
+    parser.add_argument("--json", dest="json_path",
+                        help="Also write the report as JSON to this path")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream answers and report time to first token")
+    parser.add_argument("--conversation", action="store_true",
+                        help="Run the queries as one conversation, so turns after product "
+                             "advice go through follow-up routing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    server = FakeOpenAIServer().start()
+
+    # Must be set before src.config and the OpenAI clients are imported
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "sk-fake-benchmark"
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+
+    from agents import set_tracing_disabled
+    set_tracing_disabled(True)
+
+    workdir = tempfile.TemporaryDirectory(prefix="chat-latency-")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir.name)
+    try:
+        print(
+            f"Seeding {args.products_per_category} products per category into {workdir.name}")
+        seed_catalog(args.products_per_category, rng)
+
+        server.chat_latency = LatencyDistribution.parse(
+            args.chat_latency, seed=args.seed)
+        server.embedding_latency = LatencyDistribution.parse(
+            args.embedding_latency, seed=args.seed + 1)
+        server.request_counts = {"chat": 0, "embeddings": 0}
+
+        report = asyncio.run(run_benchmark(
+            queries, args.iterations, args.warmup, args.stream, args.conversation))
+    finally:
+        from src.services.query_cache import close_caches
+        close_caches()
+        os.chdir(previous_cwd)
+        server.stop()
+        workdir.cleanup()
+
+    report["config"] = {
+        "iterations": args.iterations,
+        "queries": len(queries),
+        "chat_latency": args.chat_latency,
+        "embedding_latency": args.embedding_latency,
+        "products_per_category": args.products_per_category,
+    }
+    report["requests"] = dict(server.request_counts)
+
+    print(format_report(report, server))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 1536
+
+PC_COMPONENTS = ["CPU", "Motherboard", "RAM",
+                 "GPU", "Storage", "PSU", "Case", "Cooling"]
+
+
+class LatencyDistribution:
+    """Lognormal latency given its median and p95 in milliseconds.
+
+    Spec strings look like "800:2500" (median:p95), "800" (fixed) or "0".
+    """
+
+    def __init__(self, median_ms, p95_ms=None, seed=None):
+        self.median_ms = float(median_ms)
+        self.p95_ms = float(p95_ms) if p95_ms is not None else self.median_ms
+        self.random = random.Random(seed)
+
+        if self.median_ms > 0 and self.p95_ms > self.median_ms:
+            # p95 of a lognormal sits 1.645 sigma above the median
+            self.sigma = math.log(self.p95_ms / self.median_ms) / 1.645
+        else:
+            self.sigma = 0.0
+
+    @classmethod
+    def parse(cls, spec, seed=None):
+        parts = str(spec).split(":")
+        if len(parts) == 1:
+            return cls(parts[0], seed=seed)
+        return cls(parts[0], parts[1], seed=seed)
+
+    def sample(self):
+        if self.median_ms <= 0:
+            return 0.0
+        if self.sigma == 0:
+            return self.median_ms / 1000
+        return self.random.lognormvariate(math.log(self.median_ms), self.sigma) / 1000
+
+    def __repr__(self):
+        return f"LatencyDistribution(median={self.median_ms}ms, p95={self.p95_ms}ms)"
+
+
+def fake_embedding(text, dimensions=EMBEDDING_DIMENSIONS):
+    # Deterministic per text so identical queries land on identical neighbours
+    seed = int.from_bytes(hashlib.sha256(
+        text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _quoted_query(prompt):
+    match = re.search(r'"([^"]+)"', prompt)
+    return match.group(1) if match else prompt
+
+
+def _classify(query):
+    query = query.lower()
+    if any(k in query for k in ["cấu hình", "build", "lắp máy", "bộ máy"]):
+        return "pc_builder"
+    if any(k in query for k in ["bảo hành", "đổi trả", "chính sách", "trả góp", "giao hàng"]):
+        return "policy_advisor"
+    if any(k in query for k in ["đặt hàng", "mua ngay", "chốt đơn"]):
+        return "order_processor"
+    if any(k in query for k in ["cpu", "chip", "gpu", "card", "ram", "ssd", "nguồn", "main", "tản nhiệt"]):
+        return "product_advisor"
+    return "general"
+
+
+def fake_chat_content(messages):
+    """Answer shaped like the prompt the services send, so parsers keep working."""
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+
+    if "Phân loại đoạn text" in prompt:
+        query = prompt.split("Phân loại đoạn text này:")[-1]
+        return json.dumps({
+            "intent": _classify(query),
+            "confidence": 0.9,
+            "reasoning": "fake classifier"
+        })
+
+    if '"rankings"' in prompt:
+        ids = []
+        for item_id in re.findall(r'"id": "([^"]+)"', prompt):
+            if item_id not in ids and item_id != "item_id":
+                ids.append(item_id)
+        return json.dumps({"rankings": [
+            {"id": item_id, "score": 10 - i} for i, item_id in enumerate(ids)
+        ]})
+
+    if '"order_confidence"' in prompt:
+        query = _quoted_query(prompt.split("Tin nhắn của khách hàng:")[-1])
+        intent = _classify(query)
+        return json.dumps({
+            "intent": intent,
+            "confidence": 0.9,
+            "is_ordering": intent == "order_processor",
+            "order_confidence": 0.9 if intent == "order_processor" else 0.1,
+            "single_product": False,
+            "mentioned_product": "",
+            "reasoning": "fake context router"
+        })
+
+    if '"is_ordering"' in prompt:
+        return json.dumps({
+            "is_ordering": False,
+            "confidence": 0.1,
+            "reasoning": "fake detector",
+            "single_product": False,
+            "mentioned_product": ""
+        })
+
+    if "Truy vấn tiếng Việt" in prompt:
+        query = prompt.split("Truy vấn tiếng Việt:")[-1]
+        return f"computer hardware {_quoted_query(query)}"
+
+    if "### [Tên thành phần]" in prompt:
+        sections = []
+        for i, category in enumerate(PC_COMPONENTS):
+            sections.append(
+                f"### {category}\nFake {category} Model {i}\n- Giá: {(i + 1) * 1000}.000đ\nLựa chọn phù hợp.")
+        return "\n\n".join(sections)
+
+    return "Đây là câu trả lời mô phỏng từ máy chủ OpenAI giả lập. " * 8
+
+
+class FakeOpenAIServer:
+    """Local stand-in for the OpenAI chat-completions and embeddings API.
+
+    Point clients at it with OPENAI_BASE_URL=<server.base_url>.
+    """
+
+    def __init__(self, chat_latency=None, embedding_latency=None, host="127.0.0.1", port=0):
+        self.chat_latency = chat_latency or LatencyDistribution(0)
+        self.embedding_latency = embedding_latency or LatencyDistribution(0)
+        self.request_counts = {"chat": 0, "embeddings": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, kind):
+        with self._lock:
+            self.request_counts[kind] += 1
+
+    def _chat_response(self, body):
+        time.sleep(self.chat_latency.sample())
+        self._count("chat")
+        content = fake_chat_content(body.get("messages", []))
+        return {
+            "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": 0,
+                "completion_tokens": len(content.split()),
+                "total_tokens": len(content.split())
+            }
+        }
+
+    def _chat_stream_chunks(self, body):
+        """Yield (delay_seconds, chunk) pairs for a stream=True request.
+
+        A quarter of the sampled latency passes before the first token, the
+        rest is spread over the content, roughly like a real model.
+        """
+        total = self.chat_latency.sample()
+        self._count("chat")
+        content = fake_chat_content(body.get("messages", []))
+        pieces = re.findall(r"\S+\s*", content) or [content]
+        base = {
+            "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+        }
+
+        yield total * 0.25, {**base, "choices": [{
+            "index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}
+        step = total * 0.75 / len(pieces)
+        for piece in pieces:
+            yield step, {**base, "choices": [{
+                "index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        yield 0, {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield 0, {**base, "choices": [], "usage": {
+            "prompt_tokens": 0,
+            "completion_tokens": len(pieces),
+            "total_tokens": len(pieces)
+        }}
+
+    def _embedding_response(self, body):
+        time.sleep(self.embedding_latency.sample())
+        self._count("embeddings")
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = body.get("dimensions") or EMBEDDING_DIMENSIONS
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(str(text), dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(
+                    struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            data.append({"object": "embedding",
+                        "index": i, "embedding": vector})
+
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if self.path.endswith("/chat/completions") and body.get("stream"):
+                    self._send_stream(server._chat_stream_chunks(body))
+                    return
+                if self.path.endswith("/chat/completions"):
+                    payload = server._chat_response(body)
+                elif self.path.endswith("/embeddings"):
+                    payload = server._embedding_response(body)
+                else:
+                    self.send_error(404)
+                    return
+
+                encoded = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def _send_stream(self, chunks):
+                # Server-sent events over chunked transfer encoding, so the
+                # keep-alive connection stays usable afterwards
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def write(data):
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii"))
+                    self.wfile.write(data + b"\r\n")
+                    self.wfile.flush()
+
+                for delay, chunk in chunks:
+                    time.sleep(delay)
+                    write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                write(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
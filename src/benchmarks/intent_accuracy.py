@@ -0,0 +1,263 @@
+"""Offline accuracy and latency report for the local intent classifier.
+
+Trains on src/resources/intent_examples.tsv and evaluates on the held-out
+src/resources/intent_eval.tsv (plus leave-one-out over the training set),
+then shows how many queries each confidence threshold answers locally and
+how accurate those answers are. It also selects the softmax temperature
+with the lowest log loss and the similarity/margin floors that answer the
+most queries locally at the router's threshold while keeping those answers
+at --target-accuracy; INTENT_LOCAL_TEMPERATURE, INTENT_LOCAL_MIN_SIMILARITY
+and INTENT_LOCAL_MIN_MARGIN in src/config.py are set from it. No network
+or OpenAI key needed.
+
+    python -m src.benchmarks.intent_accuracy --thresholds 0.5,0.6,0.7,0.8
+"""
+import argparse
+import json
+import math
+import time
+
+from src.benchmarks.chat_latency import percentile
+from src.config import (INTENT_LOCAL_MIN_CONFIDENCE, INTENT_LOCAL_MIN_MARGIN,
+                        INTENT_LOCAL_MIN_SIMILARITY, INTENT_LOCAL_TEMPERATURE)
+from src.services.intent_classifier import (INTENT_EVAL_PATH, INTENT_EXAMPLES_PATH,
+                                            LocalIntentClassifier, decide, load_labeled_queries)
+
+
+def evaluate(classifier, examples):
+    latencies = []
+    for query, _ in examples:
+        start = time.perf_counter()
+        classifier.classify(query)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def score(classifier, examples):
+    return [(query, expected, classifier.scores(query)) for query, expected in examples]
+
+
+def leave_one_out(examples):
+    # The floors and temperature only act on the scores, so every
+    # classifier is trained once and the sweeps below reuse its scores
+    scored = []
+    for i, (query, expected) in enumerate(examples):
+        classifier = LocalIntentClassifier(examples[:i] + examples[i + 1:])
+        scored.append((query, expected, classifier.scores(query)))
+    return scored
+
+
+def predict(scored, temperature, min_similarity, min_margin):
+    predictions = []
+    for query, expected, scores in scored:
+        result = decide(scores, temperature, min_similarity, min_margin)
+        predictions.append((query, expected, result["intent"], result["confidence"]))
+    return predictions
+
+
+def accuracy(predictions):
+    if not predictions:
+        return 0.0
+    return sum(1 for _, expected, predicted, _ in predictions if expected == predicted) / len(predictions)
+
+
+def per_intent(predictions, intents):
+    rows = {}
+    for intent in intents:
+        true_positive = sum(1 for _, e, p, _ in predictions if e == intent and p == intent)
+        predicted = sum(1 for _, _, p, _ in predictions if p == intent)
+        actual = sum(1 for _, e, _, _ in predictions if e == intent)
+        rows[intent] = {
+            "precision": true_positive / predicted if predicted else 0.0,
+            "recall": true_positive / actual if actual else 0.0,
+            "support": actual
+        }
+    return rows
+
+
+def threshold_table(predictions, thresholds):
+    rows = []
+    for threshold in thresholds:
+        local = [p for p in predictions if p[3] >= threshold]
+        rows.append({
+            "threshold": threshold,
+            "local_share": len(local) / len(predictions) if predictions else 0.0,
+            "local_accuracy": accuracy(local)
+        })
+    return rows
+
+
+def calibration_table(scored, temperatures):
+    # Mean negative log likelihood of the expected intent under the softmax
+    # (before the similarity and margin floors); the lowest is calibrated
+    rows = []
+    for temperature in temperatures:
+        loss = 0.0
+        for _, expected, scores in scored:
+            top = max(scores.values())
+            total = sum(math.exp((value - top) / temperature) for value in scores.values())
+            loss -= (scores[expected] - top) / temperature - math.log(total)
+        rows.append({"temperature": temperature,
+                     "log_loss": loss / len(scored) if scored else 0.0})
+    return rows
+
+
+def floor_table(scored, similarities, margins, temperature, threshold):
+    rows = []
+    for min_similarity in similarities:
+        for min_margin in margins:
+            predictions = predict(scored, temperature, min_similarity, min_margin)
+            row = threshold_table(predictions, [threshold])[0]
+            rows.append({"min_similarity": min_similarity, "min_margin": min_margin,
+                         "local_share": row["local_share"], "local_accuracy": row["local_accuracy"]})
+    return rows
+
+
+def select_floors(rows, target_accuracy):
+    # Most queries answered locally among the floors accurate enough;
+    # ties go to the stricter floors
+    accurate = [row for row in rows if row["local_accuracy"] >= target_accuracy]
+    if not accurate:
+        return max(rows, key=lambda row: (row["local_accuracy"], row["min_similarity"], row["min_margin"]))
+    return max(accurate, key=lambda row: (row["local_share"], row["min_similarity"], row["min_margin"]))
+
+
+def print_report(report):
+    print(f"Training examples: {report['train_size']}, held-out: {report['eval_size']}")
+    print(f"Held-out accuracy:       {report['eval_accuracy']:.1%}")
+    print(f"Leave-one-out accuracy:  {report['loo_accuracy']:.1%}")
+    latency = report["latency_ms"]
+    print(f"Latency per query: p50 {latency['p50']:.3f}ms, p99 {latency['p99']:.3f}ms, "
+          f"max {latency['max']:.3f}ms (training {report['train_ms']:.1f}ms)")
+    print()
+
+    print(f"{'Held-out per intent':<20}{'precision':>10}{'recall':>10}{'support':>9}")
+    for intent, row in report["per_intent"].items():
+        print(f"{intent:<20}{row['precision']:>10.1%}{row['recall']:>10.1%}{row['support']:>9}")
+    print()
+
+    print(f"{'Min confidence':<20}{'answered locally':>18}{'local accuracy':>16}")
+    for row in report["thresholds"]:
+        print(f"{row['threshold']:<20}{row['local_share']:>18.1%}{row['local_accuracy']:>16.1%}")
+
+    print()
+    print(f"{'Temperature':<20}{'log loss':>18}")
+    for row in report["calibration"]:
+        print(f"{row['temperature']:<20}{row['log_loss']:>18.3f}")
+
+    print()
+    print(f"At min confidence {report['threshold']} and temperature {report['temperature']}:")
+    print(f"{'Min similarity':<16}{'min margin':>12}{'answered locally':>18}{'local accuracy':>16}")
+    for row in report["floors"]:
+        print(f"{row['min_similarity']:<16}{row['min_margin']:>12}"
+              f"{row['local_share']:>18.1%}{row['local_accuracy']:>16.1%}")
+
+    selected = report["selected"]
+    print()
+    print(f"Selected: temperature {selected['temperature']}, min similarity "
+          f"{selected['min_similarity']}, min margin {selected['min_margin']} "
+          f"({selected['local_share']:.1%} answered locally, {selected['local_accuracy']:.1%} accurate; "
+          f"target {report['target_accuracy']:.0%})")
+
+    if report["errors"]:
+        print()
+        print("Held-out errors:")
+        for error in report["errors"]:
+            print(f"  {error['expected']:>16} -> {error['predicted']:<16} "
+                  f"({error['confidence']:.2f}) {error['query']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline accuracy/latency report for the local intent classifier")
+    parser.add_argument("--train", default=INTENT_EXAMPLES_PATH,
+                        help="Labeled training queries (intent<TAB>query)")
+    parser.add_argument("--eval", dest="eval_path", default=INTENT_EVAL_PATH,
+                        help="Labeled held-out queries (intent<TAB>query)")
+    parser.add_argument("--thresholds", default="0.4,0.5,0.6,0.7,0.8,0.9",
+                        help="Comma separated confidence thresholds to tabulate")
+    parser.add_argument("--temperatures", default="0.02,0.03,0.04,0.05,0.07,0.1,0.15,0.2",
+                        help="Comma separated softmax temperatures to calibrate over")
+    parser.add_argument("--similarities", default="0,0.1,0.15,0.2,0.25,0.3,0.35,0.4",
+                        help="Comma separated similarity floors to sweep")
+    parser.add_argument("--margins", default="0,0.01,0.02,0.03,0.05,0.07,0.1",
+                        help="Comma separated margin floors to sweep")
+    parser.add_argument("--threshold", type=float, default=INTENT_LOCAL_MIN_CONFIDENCE,
+                        help="Router confidence threshold the floors are swept at")
+    parser.add_argument("--target-accuracy", type=float, default=0.95,
+                        help="Local accuracy the selected floors must keep")
+    parser.add_argument("--temperature", type=float, default=INTENT_LOCAL_TEMPERATURE,
+                        help="Softmax temperature of the evaluated classifier")
+    parser.add_argument("--min-similarity", type=float, default=INTENT_LOCAL_MIN_SIMILARITY,
+                        help="Similarity floor below which the confidence is 0")
+    parser.add_argument("--min-margin", type=float, default=INTENT_LOCAL_MIN_MARGIN,
+                        help="Top-1/top-2 margin floor below which the confidence is 0")
+    parser.add_argument("--repeat", type=int, default=200,
+                        help="Passes over the held-out set when timing")
+    parser.add_argument("--json", dest="json_path",
+                        help="Also write the report as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    train = load_labeled_queries(args.train)
+    held_out = load_labeled_queries(args.eval_path)
+    thresholds = [float(value) for value in args.thresholds.split(",")]
+    temperatures = [float(value) for value in args.temperatures.split(",")]
+    similarities = [float(value) for value in args.similarities.split(",")]
+    margins = [float(value) for value in args.margins.split(",")]
+    options = {"temperature": args.temperature,
+               "min_similarity": args.min_similarity, "min_margin": args.min_margin}
+
+    start = time.perf_counter()
+    classifier = LocalIntentClassifier(train, **options)
+    train_ms = (time.perf_counter() - start) * 1000
+
+    held_out_scored = score(classifier, held_out)
+    loo_scored = leave_one_out(train)
+    predictions = predict(held_out_scored, **options)
+    loo = predict(loo_scored, **options)
+    latencies = []
+    for _ in range(args.repeat):
+        latencies.extend(evaluate(classifier, held_out))
+
+    # Calibrated and swept on held-out and leave-one-out scores together,
+    # the held-out set alone is too small to tell the floors apart
+    scored = held_out_scored + loo_scored
+    calibration = calibration_table(scored, temperatures)
+    temperature = min(calibration, key=lambda row: row["log_loss"])["temperature"]
+    floors = floor_table(scored, similarities, margins, temperature, args.threshold)
+    selected = dict(select_floors(floors, args.target_accuracy), temperature=temperature)
+
+    report = {
+        "train_size": len(train),
+        "eval_size": len(held_out),
+        "train_ms": train_ms,
+        "eval_accuracy": accuracy(predictions),
+        "loo_accuracy": accuracy(loo),
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000 if latencies else 0.0
+        },
+        "per_intent": per_intent(predictions, classifier.intents),
+        "thresholds": threshold_table(predictions + loo, thresholds),
+        "calibration": calibration,
+        "threshold": args.threshold,
+        "temperature": temperature,
+        "target_accuracy": args.target_accuracy,
+        "floors": floors,
+        "selected": selected,
+        "errors": [{"query": q, "expected": e, "predicted": p, "confidence": c}
+                   for q, e, p, c in predictions if e != p]
+    }
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,16 +17,134 @@ POSTGRES_CONFIG = {
     "port": os.environ.get("POSTGRES_PORT", "5432")
 }
 
+# PostgreSQL Connection Pool (shared by the whole process, leased per query)
+POSTGRES_POOL_MIN = int(os.environ.get("POSTGRES_POOL_MIN", 1))
+POSTGRES_POOL_MAX = int(os.environ.get("POSTGRES_POOL_MAX", 10))
+# Idle connections are pinged before reuse after this many seconds
+POSTGRES_HEALTHCHECK_INTERVAL = float(
+    os.environ.get("POSTGRES_HEALTHCHECK_INTERVAL", 30))
+POSTGRES_CONNECT_TIMEOUT = int(os.environ.get("POSTGRES_CONNECT_TIMEOUT", 5))
+# After the server could not be reached, queries fail fast for this long
+# (the PC builder then falls back to search at once)
+POSTGRES_RETRY_COOLDOWN = float(
+    os.environ.get("POSTGRES_RETRY_COOLDOWN", 30))
+
 # ChromaDB Configuration
 CHROMA_CLIENT_SETTINGS = {
     "chroma_db_impl": "duckdb+parquet",
     "persist_directory": os.environ.get("CHROMA_PERSIST_DIR", "./chroma_db")
 }
 
+# Query Enhancement Cache (set QUERY_CACHE_PATH="" to keep it in memory only)
+QUERY_CACHE_PATH = os.environ.get(
+    "QUERY_CACHE_PATH", "./cache/query_enhancement.sqlite3")
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", 2048))
+QUERY_CACHE_TTL = int(os.environ.get("QUERY_CACHE_TTL", 7 * 24 * 3600))
+
+# Embedding Cache: vectors keyed by hash(model, text), memory-mapped from
+# EMBEDDING_CACHE_DIR (set it to "" to call the embedding API every time)
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "./cache/embeddings")
+
+# Local Query Expander: the LLM only enhances queries the dictionaries
+# cover less than LOCAL_EXPANDER_MIN_COVERAGE of
+LOCAL_EXPANDER_ENABLED = os.environ.get(
+    "LOCAL_EXPANDER_ENABLED", "true").lower() == "true"
+LOCAL_EXPANDER_MIN_COVERAGE = float(
+    os.environ.get("LOCAL_EXPANDER_MIN_COVERAGE", 0.75))
+
+# Reranker backend: "local" (BM25 + vector + metadata features, milliseconds)
+# or "llm" (gpt-4o scoring, opt-in)
+RERANKER_BACKEND = os.environ.get("RERANKER_BACKEND", "local")
+
+# Rerank Result Cache, keyed by query, candidate ids and catalog version.
+# Only the llm backend's results go to disk; local ones stay in memory.
+# Bump CATALOG_VERSION after re-ingesting the catalog in another process
+RERANK_CACHE_PATH = os.environ.get(
+    "RERANK_CACHE_PATH", "./cache/rerank.sqlite3")
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", 4096))
+RERANK_CACHE_TTL = int(os.environ.get("RERANK_CACHE_TTL", 24 * 3600))
+CATALOG_VERSION = os.environ.get("CATALOG_VERSION", "1")
+
+# Stream agent answers to the UI token by token
+STREAM_RESPONSES = os.environ.get(
+    "STREAM_RESPONSES", "true").lower() == "true"
+
+# Intent routing: a local classifier answers first and the LLM classifier is
+# only asked when its confidence is below the threshold
+# (python -m src.benchmarks.intent_accuracy shows the trade-off)
+INTENT_LOCAL_CLASSIFIER = os.environ.get(
+    "INTENT_LOCAL_CLASSIFIER", "true").lower() == "true"
+INTENT_LOCAL_MIN_CONFIDENCE = float(
+    os.environ.get("INTENT_LOCAL_MIN_CONFIDENCE", 0.7))
+# Softmax temperature of the local confidence, and the cosine similarity to
+# the best intent and gap to the runner-up below which the local answer is
+# not trusted; all three are selected by src.benchmarks.intent_accuracy
+INTENT_LOCAL_TEMPERATURE = float(
+    os.environ.get("INTENT_LOCAL_TEMPERATURE", 0.03))
+INTENT_LOCAL_MIN_SIMILARITY = float(
+    os.environ.get("INTENT_LOCAL_MIN_SIMILARITY", 0.15))
+INTENT_LOCAL_MIN_MARGIN = float(
+    os.environ.get("INTENT_LOCAL_MIN_MARGIN", 0.07))
+
+# Messages stay with the previous agent when the local classifier agrees with
+# it, or when they read like a follow-up and the classifier is below this
+# confidence for another intent; anything else is routed again
+STICKY_ROUTING = os.environ.get("STICKY_ROUTING", "true").lower() == "true"
+STICKY_SHIFT_MIN_CONFIDENCE = float(
+    os.environ.get("STICKY_SHIFT_MIN_CONFIDENCE", 0.99))
+
+# Start query enhancement (and the query embedding) while the router is still
+# choosing an agent; cancelled when the route does not search
+SPECULATIVE_PREWORK = os.environ.get(
+    "SPECULATIVE_PREWORK", "true").lower() == "true"
+
+# HTTP Server Sessions (src/app/server.py)
+SERVER_SESSION_TTL = int(os.environ.get("SERVER_SESSION_TTL", 1800))
+SERVER_MAX_SESSIONS = int(os.environ.get("SERVER_MAX_SESSIONS", 10000))
+
+# Per-session conversation state (recently advised products, order context).
+# "memory" keeps it in this process, "sqlite" shares it between workers on
+# one host and "redis" between hosts (needs the redis package)
+SESSION_STATE_BACKEND = os.environ.get("SESSION_STATE_BACKEND", "memory")
+SESSION_STATE_PATH = os.environ.get(
+    "SESSION_STATE_PATH", "./cache/session_state.sqlite3")
+SESSION_STATE_REDIS_URL = os.environ.get(
+    "SESSION_STATE_REDIS_URL", "redis://localhost:6379/0")
+SESSION_STATE_TTL = int(os.environ.get("SESSION_STATE_TTL", 6 * 3600))
+
 # Product Generation Settings
 PRODUCTS_PER_CATEGORY = 100
 BATCH_SIZE = 5
 MAX_BATCH_ATTEMPTS = 30
+# Generated products are written to Postgres and Chroma in batches of this size
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 100))
+
+# Chroma writes are split so each embedding request stays under the API's
+# input limits (2048 inputs, ~300k tokens per request)
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 1024))
+EMBEDDING_BATCH_MAX_CHARS = int(
+    os.environ.get("EMBEDDING_BATCH_MAX_CHARS", 600_000))
+
+# PC Builder Settings
+PC_BUILDER_PARALLEL_SEARCH = os.environ.get(
+    "PC_BUILDER_PARALLEL_SEARCH", "true").lower() == "true"
+PC_BUILDER_SEARCH_CONCURRENCY = int(
+    os.environ.get("PC_BUILDER_SEARCH_CONCURRENCY", 4))
+PC_BUILDER_SEARCH_TIMEOUT = float(
+    os.environ.get("PC_BUILDER_SEARCH_TIMEOUT", 20))
+# Pick builds with the compatibility-checked optimizer over the Postgres
+# catalog; the LLM only explains them. Falls back to search when Postgres
+# is unreachable or no compatible build fits the budget
+PC_BUILDER_OPTIMIZER = os.environ.get(
+    "PC_BUILDER_OPTIMIZER", "true").lower() == "true"
+# In-stock candidates kept per category (and CPU socket) by the optimizer's
+# catalog query, best spec score first within each category's price band
+BUILD_CANDIDATES_PER_CATEGORY = int(
+    os.environ.get("BUILD_CANDIDATES_PER_CATEGORY", 40))
+# Keep the optimizer's build per session so "đổi GPU sang loại rẻ hơn" swaps
+# only that part and rewrites only its section of the previous answer
+PC_BUILDER_EDITS = os.environ.get(
+    "PC_BUILDER_EDITS", "true").lower() == "true"
 
 # Product Categories
 PRODUCT_CATEGORIES = [
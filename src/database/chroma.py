@@ -1,9 +1,19 @@
-import chromadb
+import asyncio
 import re
-import uuid
 from chromadb.utils import embedding_functions
-from src.config import OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL
+from src.config import OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_MAX_CHARS
 from src.services.enhance_product_embedding import generate_enhanced_product_document
+from src.services.stage_timer import stage
+from src.services.query_cache import bump_catalog_version
+from src.services.query_embedding import embed_query, prefetch_query_embedding
+from src.services.embedding_cache import CachedEmbeddingFunction, get_embedding_store
+from src.services.resource_registry import get_chroma_client
+
+
+class TimedOpenAIEmbeddingFunction(embedding_functions.OpenAIEmbeddingFunction):
+    def __call__(self, input):
+        with stage("embed"):
+            return super().__call__(input)
 
 
 class ChromaDB:
@@ -11,15 +21,22 @@ class ChromaDB:
         self.client = None
         self.collection = None
         self.collection_policy = None
+        self.embedding_function = None
         self.chunk_size = 512
         self.chunk_overlap = 128
 
     def connect(self, collection_name="computer_parts"):
-        self.client = chromadb.PersistentClient()
-        openai_ef = embedding_functions.OpenAIEmbeddingFunction(
+        # One PersistentClient per process, shared by every collection
+        self.client = get_chroma_client()
+        openai_ef = TimedOpenAIEmbeddingFunction(
             api_key=OPENAI_API_KEY,
             model_name=OPENAI_EMBEDDING_MODEL
         )
+        embedding_store = get_embedding_store()
+        if embedding_store is not None:
+            openai_ef = CachedEmbeddingFunction(
+                openai_ef, OPENAI_EMBEDDING_MODEL, embedding_store)
+        self.embedding_function = openai_ef
 
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
@@ -52,8 +69,9 @@ class ChromaDB:
                 chunk_text = " ".join(current_chunk)
                 chunks.append(chunk_text)
 
-                # Create a unique ID for this chunk
-                chunk_id = f"{product_id}-{str(uuid.uuid4())[:8]}"
+                # Stable per product and position, so re-ingesting replaces
+                # the old chunk instead of adding a duplicate
+                chunk_id = f"{product_id}-{len(chunks) - 1}"
                 chunk_ids.append(chunk_id)
 
                 # Add product_id to metadata to track the source
@@ -73,7 +91,7 @@ class ChromaDB:
             chunk_text = " ".join(current_chunk)
             chunks.append(chunk_text)
 
-            chunk_id = f"{product_id}-{str(uuid.uuid4())[:8]}"
+            chunk_id = f"{product_id}-{len(chunks) - 1}"
             chunk_ids.append(chunk_id)
 
             chunk_metadata = metadata.copy()
@@ -84,38 +102,89 @@ class ChromaDB:
         return chunks, chunk_ids, chunk_metadatas
 
     def add_product(self, product_id, product, category, specs_text):
-        product_text = generate_enhanced_product_document(
-            product, category, specs_text)
-
-        metadata = {
-            "category": category,
-            "price": product["price"],
-            "brand": product["brand"],
-            "product_id": str(product_id),
-            "model": product["model"]
-        }
-
-        # Create overlapping chunks
-        chunks, chunk_ids, chunk_metadatas = self._create_chunks(
-            product_text, metadata, product_id)
-
-        # Add chunks to collection
-        if chunks:
-            self.collection.add(
-                ids=chunk_ids,
-                metadatas=chunk_metadatas,
-                documents=chunks
-            )
+        self.add_products([(product_id, product, category, specs_text)])
+
+    def add_products(self, items):
+        """Index (product_id, product, category, specs_text) tuples.
+
+        Chunks and full product documents of the whole batch are upserted
+        together, split by _write_batches to fit the embedding API limits.
+        """
+        ids = []
+        metadatas = []
+        documents = []
+
+        for product_id, product, category, specs_text in items:
+            product_text = generate_enhanced_product_document(
+                product, category, specs_text)
+
+            metadata = {
+                "category": category,
+                "price": product["price"],
+                "brand": product["brand"],
+                "product_id": str(product_id),
+                "model": product["model"]
+            }
 
-            self.collection.add(
-                ids=[str(product_id)],
-                metadatas=[metadata],
-                documents=[product_text]
+            # Create overlapping chunks
+            chunks, chunk_ids, chunk_metadatas = self._create_chunks(
+                product_text, metadata, product_id)
+
+            if chunks:
+                ids.extend(chunk_ids + [str(product_id)])
+                metadatas.extend(chunk_metadatas + [metadata])
+                documents.extend(chunks + [product_text])
+
+        if documents:
+            self._write_batches(ids, metadatas, documents)
+            bump_catalog_version()
+
+    def _write_batches(self, ids, metadatas, documents):
+        start = 0
+        while start < len(documents):
+            end = start
+            batch_chars = 0
+            while end < len(documents) and end - start < EMBEDDING_BATCH_SIZE:
+                if end > start and batch_chars + len(documents[end]) > EMBEDDING_BATCH_MAX_CHARS:
+                    break
+                batch_chars += len(documents[end])
+                end += 1
+
+            # upsert keeps a re-ingest of the same products idempotent
+            self.collection.upsert(
+                ids=ids[start:end],
+                metadatas=metadatas[start:end],
+                documents=documents[start:end]
             )
+            start = end
+
+    def embed_query(self, query):
+        # Reuses the vector when the same text was embedded earlier in the
+        # current request_embedding_scope()
+        return embed_query(self.embedding_function, OPENAI_EMBEDDING_MODEL, query)
+
+    def prefetch_query(self, query):
+        return prefetch_query_embedding(self.embedding_function, OPENAI_EMBEDDING_MODEL, query)
+
+    def search(self, query, n_results=3, filter_dict=None, query_embedding=None):
+        with stage("ann"):
+            return self._search(query, n_results, filter_dict, query_embedding)
+
+    async def search_async(self, query, n_results=3, filter_dict=None, query_embedding=None):
+        # Chroma has no async client for a local PersistentClient, so the
+        # query (and its embedding call) runs in the default executor
+        return await asyncio.to_thread(self.search, query, n_results, filter_dict, query_embedding)
+
+    async def query_async(self, **kwargs):
+        return await asyncio.to_thread(self.collection.query, **kwargs)
+
+    def _search(self, query, n_results, filter_dict, query_embedding=None):
+        # Both queries below share one embedding of the query text
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
 
-    def search(self, query, n_results=3, filter_dict=None):
         chunk_results = self.collection.query(
-            query_texts=[query],
+            query_embeddings=[query_embedding],
             n_results=n_results * 3,
             where=filter_dict
         )
@@ -133,7 +202,7 @@ class ChromaDB:
                 where_filter = {"$and": [where_filter, filter_dict]}
 
             product_results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=[query_embedding],
                 n_results=n_results,
                 where=where_filter
             )
@@ -1,6 +1,12 @@
+import asyncio
 import json
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
-from src.config import POSTGRES_CONFIG
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from src.config import POSTGRES_CONFIG, POSTGRES_POOL_MIN, POSTGRES_POOL_MAX, POSTGRES_HEALTHCHECK_INTERVAL, POSTGRES_CONNECT_TIMEOUT, POSTGRES_RETRY_COOLDOWN
 
 
 class PostgresDB:
@@ -57,6 +63,18 @@ class PostgresDB:
         else:
             print("Database tables already exist, skipping creation")
 
+        self.create_indexes()
+
+    def create_indexes(self):
+        # Serves the PC builder's per-category candidate query: in-stock
+        # products of a category within a price band
+        self.cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_category_price_in_stock
+        ON products (category_id, price)
+        WHERE stock > 0
+        """)
+        self.conn.commit()
+
     def insert_categories(self, categories):
         for category in categories:
             self.cur.execute(
@@ -91,6 +109,38 @@ class PostgresDB:
         self.conn.commit()
         return product_id
 
+    def insert_products(self, rows):
+        """Insert (category_id, product) pairs in one statement and one commit.
+
+        Returns the new product ids in the same order as rows.
+        """
+        if not rows:
+            return []
+
+        values = [(
+            category_id,
+            product["name"],
+            product["brand"],
+            product["model"],
+            product["price"],
+            json.dumps(product["specs"]),
+            product["stock"]
+        ) for category_id, product in rows]
+
+        try:
+            # page_size covers the whole batch, so this is a single round trip
+            result = execute_values(self.cur, """
+            INSERT INTO products (category_id, name, brand, model, price, specs, stock)
+            VALUES %s
+            RETURNING id
+            """, values, page_size=len(values), fetch=True)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        return [row[0] for row in result]
+
     def get_product_count_by_category(self):
         self.cur.execute("""
         SELECT categories.name, COUNT(*) 
@@ -106,3 +156,153 @@ class PostgresDB:
         if self.conn:
             self.conn.close()
         print("PostgreSQL connection closed")
+
+
+class PostgresPool:
+    """Process-wide pool of PostgreSQL connections, leased per query.
+
+    The pool is opened on the first lease. A connection idle for more than
+    healthcheck_interval seconds is pinged before use and replaced if the
+    server dropped it. Callers block while all max_size connections are out.
+    After the server could not be reached, leases fail at once for
+    retry_cooldown seconds instead of each waiting out connect_timeout.
+    """
+
+    def __init__(self, min_size=1, max_size=10, healthcheck_interval=30, connect_timeout=5,
+                 retry_cooldown=30):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.healthcheck_interval = healthcheck_interval
+        self.connect_timeout = connect_timeout
+        self.retry_cooldown = retry_cooldown
+        self._failed_at = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(
+                        self.min_size,
+                        self.max_size,
+                        connect_timeout=self.connect_timeout,
+                        **POSTGRES_CONFIG
+                    )
+                    print("PostgreSQL connection pool opened")
+        return self._pool
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn), 0)
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _check_cooldown(self):
+        failed_at = self._failed_at
+        if failed_at is None:
+            return
+        remaining = self.retry_cooldown - (time.monotonic() - failed_at)
+        if remaining > 0:
+            raise psycopg2.OperationalError(
+                f"PostgreSQL unreachable, next attempt in {remaining:.0f}s")
+
+    def _checkout(self):
+        try:
+            pool = self._get_pool()
+            # Stale connections are discarded and fresh ones opened; a third
+            # broken one means the server itself is in trouble
+            for _ in range(3):
+                conn = pool.getconn()
+                if self._is_healthy(conn):
+                    self._failed_at = None
+                    return conn
+                print("Discarding broken PostgreSQL connection")
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError(
+                "No healthy PostgreSQL connection after 3 attempts")
+        except psycopg2.OperationalError:
+            self._failed_at = time.monotonic()
+            raise
+
+    @contextmanager
+    def connection(self):
+        self._check_cooldown()
+        self._slots.acquire()
+        try:
+            conn = self._checkout()
+            broken = False
+            try:
+                yield conn
+                conn.commit()
+            except Exception as e:
+                broken = conn.closed or isinstance(
+                    e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if broken:
+                    self._last_used.pop(id(conn), None)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn, close=broken)
+        finally:
+            self._slots.release()
+
+    def query(self, sql, params=None, fetch="all"):
+        """Run one statement on a leased connection.
+
+        fetch is "all" (list of rows), "one" (a row or None) or None for
+        statements without a result. The transaction is committed on success.
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                if fetch == "all":
+                    return cur.fetchall()
+                if fetch == "one":
+                    return cur.fetchone()
+                return None
+
+    async def query_async(self, sql, params=None, fetch="all"):
+        # psycopg2 is blocking; the pool bounds how many threads wait on it
+        return await asyncio.to_thread(self.query, sql, params, fetch)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._last_used.clear()
+                print("PostgreSQL connection pool closed")
+
+
+_postgres_pool = None
+_postgres_pool_lock = threading.Lock()
+
+
+def get_postgres_pool():
+    global _postgres_pool
+    if _postgres_pool is None:
+        with _postgres_pool_lock:
+            if _postgres_pool is None:
+                _postgres_pool = PostgresPool(
+                    min_size=POSTGRES_POOL_MIN,
+                    max_size=POSTGRES_POOL_MAX,
+                    healthcheck_interval=POSTGRES_HEALTHCHECK_INTERVAL,
+                    connect_timeout=POSTGRES_CONNECT_TIMEOUT,
+                    retry_cooldown=POSTGRES_RETRY_COOLDOWN
+                )
+    return _postgres_pool
@@ -1,7 +1,7 @@
 import json
 import time
 from openai import OpenAI
-from src.config import OPENAI_API_KEY, OPENAI_MODEL, PRODUCT_CATEGORIES, BATCH_SIZE, MAX_BATCH_ATTEMPTS
+from src.config import OPENAI_API_KEY, OPENAI_MODEL, PRODUCT_CATEGORIES, BATCH_SIZE, MAX_BATCH_ATTEMPTS, INGEST_BATCH_SIZE
 
 
 class ProductGenerator:
@@ -141,6 +141,23 @@ class ProductGenerator:
 
         return ". ".join(specs_flat)
 
+    def _flush_products(self, staged):
+        if not staged:
+            return
+
+        # One INSERT ... RETURNING and one commit for the whole batch
+        product_ids = self.postgres_db.insert_products(
+            [(category_id, product) for category_id, _, product in staged])
+
+        self.chroma_db.add_products([
+            (product_id, product, category,
+             self._flatten_specs(product['specs']))
+            for product_id, (_, category, product) in zip(product_ids, staged)
+        ])
+
+        print(f"  Saved {len(staged)} products to PostgreSQL and ChromaDB")
+        staged.clear()
+
     def generate_products(self, products_per_category=100):
         self.postgres_db.insert_categories(PRODUCT_CATEGORIES)
         category_ids = self.postgres_db.get_category_ids(PRODUCT_CATEGORIES)
@@ -153,6 +170,7 @@ class ProductGenerator:
                 f"Generating {products_per_category} products for {category}...")
             category_id = category_ids[category]
             products_created = 0
+            staged = []
 
             batch_number = 1
             while products_created < products_per_category:
@@ -187,16 +205,8 @@ class ProductGenerator:
 
                             self.all_products.add(product_identifier)
 
-                            # Insert product into PostgreSQL
-                            product_id = self.postgres_db.insert_product(
-                                category_id, product)
-
-                            # Process specs for ChromaDB
-                            specs_text = self._flatten_specs(product['specs'])
-
-                            # Add to ChromaDB
-                            self.chroma_db.add_product(
-                                product_id, product, category, specs_text)
+                            # Staged and written in bulk by _flush_products
+                            staged.append((category_id, category, product))
 
                             products_created += 1
                             if products_created >= products_per_category:
@@ -205,6 +215,9 @@ class ProductGenerator:
                         print(
                             f"  Added {min(len(products), products_per_category - (products_created - len(products)))} new products for {category}, batch {batch_number}")
 
+                        if len(staged) >= INGEST_BATCH_SIZE:
+                            self._flush_products(staged)
+
                     except json.JSONDecodeError as e:
                         print(
                             f"  Error decoding JSON for {category}, batch {batch_number}: {e}")
@@ -222,6 +235,8 @@ class ProductGenerator:
                         f"  Reached maximum batch attempts for {category}. Generated {products_created} products.")
                     break
 
+            self._flush_products(staged)
+
             print(
                 f"Completed generating {products_created} products for {category}")
 
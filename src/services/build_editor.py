@@ -0,0 +1,101 @@
+import re
+from src.services.query_cache import normalize_query
+
+# Accent-free names customers use for the build's components
+COMPONENT_PATTERNS = {
+    "CPU": re.compile(r"\b(?:cpu|chip|vi xu ly|bo xu ly|processor)\b"),
+    "Motherboard": re.compile(r"\b(?:main|mainboard|motherboard|mobo|bo mach chu)\b"),
+    "RAM": re.compile(r"\b(?:ram|bo nho)\b"),
+    "GPU": re.compile(r"\b(?:gpu|vga|card)\b"),
+    "Storage": re.compile(r"\b(?:o cung|ssd|hdd|storage|o luu tru)\b"),
+    "PSU": re.compile(r"\b(?:nguon|psu)\b"),
+    "Case": re.compile(r"\b(?:case|vo may|thung may)\b"),
+    "Cooling": re.compile(r"\b(?:tan nhiet|cooling|cooler|quat)\b"),
+}
+
+CHEAPER_PATTERN = re.compile(
+    r"\b(?:re hon|giam|ha cap|ha xuong|tiet kiem|bot tien|gia thap hon|mem hon)\b")
+BETTER_PATTERN = re.compile(
+    r"\b(?:manh hon|tot hon|xin hon|cao hon|nang cap|nang len|khoe hon|ngon hon)\b")
+# An edit names the part right after its verb ("đổi GPU", "nâng cấp RAM")
+# or asks for another model ("sang loại rẻ hơn")
+EDIT_VERB_PATTERN = re.compile(r"\b(?:doi|thay|nang|ha|chuyen|giam)(?: \w+){0,2}? ?$")
+SWITCH_PATTERN = re.compile(r"\bsang (?:loai|con|cai|mau|ban|dong)\b")
+# "CPU nào tốt hơn?", "đổi trả ssd", "card nào giảm giá" ask about
+# products or policies, not about the build
+QUESTION_PATTERN = re.compile(r"\b(?:nao|khong|gi|sao|co phai)\b")
+POLICY_PATTERN = re.compile(
+    r"\b(?:doi tra|tra hang|hoan tien|bao hanh|chinh sach|giam gia|khuyen mai)\b")
+# "tản nhiệt khác cho CPU": components after these only give context
+CONTEXT_PATTERN = re.compile(r"\b(?:cho|cua|voi|hop)\b")
+
+TOTAL_PATTERN = re.compile(r"\btong (?:chi phi|cong|gia)\b")
+
+
+def _component_matches(text):
+    found = []
+    for category, pattern in COMPONENT_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            found.append((match.start(), category))
+    return sorted(found)
+
+
+def mentioned_components(text):
+    """Build categories named in text, in the order they appear."""
+    return [category for _, category in _component_matches(normalize_query(text))]
+
+
+def parse_build_edit(query):
+    """(categories, direction) when query asks to change parts of the
+    previous build, e.g. "đổi GPU sang loại rẻ hơn"; otherwise None."""
+    text = normalize_query(query)
+    if "?" in query or QUESTION_PATTERN.search(text) or POLICY_PATTERN.search(text):
+        return None
+
+    context = CONTEXT_PATTERN.search(text)
+    matches = (context and _component_matches(text[:context.start()])) or \
+        _component_matches(text)
+    if not matches:
+        return None
+    if not SWITCH_PATTERN.search(text) and \
+            not any(EDIT_VERB_PATTERN.search(text[:start]) for start, _ in matches):
+        return None
+
+    categories = [category for _, category in matches]
+    if CHEAPER_PATTERN.search(text):
+        return categories, "cheaper"
+    if BETTER_PATTERN.search(text):
+        return categories, "better"
+    return categories, "other"
+
+
+def split_sections(answer):
+    """Break a build answer into [category, text] per "### " section.
+
+    Text before the first section is dropped, and so are the total lines,
+    which are recomputed whenever the build changes.
+    """
+    sections = []
+    for block in re.split(r"(?m)^(?=#{2,3} )", answer or ""):
+        if not block.startswith("#"):
+            continue
+        heading = block.splitlines()[0]
+        if TOTAL_PATTERN.search(normalize_query(heading)):
+            continue
+        components = mentioned_components(heading)
+        lines = [line for line in block.rstrip().splitlines()
+                 if not TOTAL_PATTERN.search(normalize_query(line))]
+        sections.append([components[0] if components else None, "\n".join(lines)])
+    return sections
+
+
+def replace_sections(sections, replacements):
+    """sections with the given categories' text swapped; categories without
+    a section of their own are added at the end."""
+    updated = [[category, replacements.get(category, text)]
+               for category, text in sections]
+    present = {category for category, _ in sections}
+    updated.extend([category, text] for category, text in replacements.items()
+                   if category not in present)
+    return updated
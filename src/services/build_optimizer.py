@@ -0,0 +1,578 @@
+import math
+import re
+
+BUILD_CATEGORIES = ["CPU", "Motherboard", "RAM",
+                    "GPU", "PSU", "Storage", "Case", "Cooling"]
+
+# Share of the build score each category carries for a purpose; a query
+# with several purposes averages their weights
+PURPOSE_WEIGHTS = {
+    "gaming": {"CPU": 0.20, "Motherboard": 0.08, "RAM": 0.12, "GPU": 0.35,
+               "PSU": 0.07, "Storage": 0.10, "Case": 0.04, "Cooling": 0.04},
+    "graphics": {"CPU": 0.28, "Motherboard": 0.07, "RAM": 0.18, "GPU": 0.25,
+                 "PSU": 0.05, "Storage": 0.12, "Case": 0.03, "Cooling": 0.02},
+    "office": {"CPU": 0.30, "Motherboard": 0.10, "RAM": 0.20, "GPU": 0.00,
+               "PSU": 0.07, "Storage": 0.25, "Case": 0.05, "Cooling": 0.03},
+    "dev": {"CPU": 0.30, "Motherboard": 0.08, "RAM": 0.25, "GPU": 0.05,
+            "PSU": 0.05, "Storage": 0.20, "Case": 0.04, "Cooling": 0.03},
+    "streaming": {"CPU": 0.27, "Motherboard": 0.08, "RAM": 0.15, "GPU": 0.28,
+                  "PSU": 0.06, "Storage": 0.10, "Case": 0.03, "Cooling": 0.03},
+    "general": {"CPU": 0.25, "Motherboard": 0.10, "RAM": 0.15, "GPU": 0.20,
+                "PSU": 0.07, "Storage": 0.15, "Case": 0.05, "Cooling": 0.03},
+}
+
+# Below this GPU weight a CPU with integrated graphics may go without a card
+OPTIONAL_GPU_WEIGHT = 0.1
+# CPUs above this TDP need a separate cooler
+STOCK_COOLER_MAX_TDP = 105
+# Power assumed for the rest of the system, and PSU headroom over the load
+BASE_SYSTEM_WATTS = 75
+PSU_HEADROOM = 1.3
+
+
+def _number(value):
+    match = re.search(r"\d+(?:[.,]\d+)?", str(value))
+    return float(match.group(0).replace(",", ".")) if match else None
+
+
+def _spec(specs, *keys):
+    for key in keys:
+        if specs.get(key) not in (None, ""):
+            return specs[key]
+    return None
+
+
+def _socket(value):
+    if value is None:
+        return None
+    socket = re.sub(r"[\s_-]|SOCKET", "", str(value).upper())
+    return socket or None
+
+
+def _memory_types(value):
+    return set(re.findall(r"DDR\d", str(value or "").upper()))
+
+
+def _form_factors(value):
+    text = str(value or "").upper().replace("MICRO", "M").replace("MINI", "")
+    found = set()
+    for form in re.findall(r"E-?ATX|M-?ATX|M-?ITX|ITX|ATX", text):
+        form = form.replace("-", "")
+        found.add("ITX" if form == "MITX" else form)
+    return found
+
+
+def _capacity_gb(value):
+    number = _number(value)
+    if number is None:
+        return None
+    return number * 1000 if "TB" in str(value).upper() else number
+
+
+def _has_integrated_graphics(value):
+    if value is None:
+        return False
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    return bool(text) and not text.startswith(("no", "none", "không", "false"))
+
+
+class BuildPart:
+    """One catalog product with the specs the optimizer checks, parsed once."""
+
+    def __init__(self, product_id, category, name, price, specs):
+        self.product_id = product_id
+        self.category = category
+        self.name = name
+        self.price = float(price)
+        self.specs = specs or {}
+        self.quality = 0.0
+
+        specs = self.specs
+        self.socket = _socket(_spec(specs, "socket"))
+        self.tdp = _number(_spec(specs, "tdp", "power_consumption"))
+        self.memory_types = _memory_types(
+            _spec(specs, "memory_type", "type") if category in ("Motherboard", "RAM") else None)
+        self.wattage = _number(
+            _spec(specs, "wattage")) if category == "PSU" else None
+        self.form_factors = _form_factors(
+            _spec(specs, "form_factor", "motherboard_support", "supported_motherboards"))
+        self.integrated_graphics = _has_integrated_graphics(
+            _spec(specs, "integrated_graphics"))
+        self.cooler_sockets = {_socket(s) for s in re.split(
+            r"[,/;]", str(_spec(specs, "socket_compatibility") or "")) if _socket(s)}
+        self.cooler_tdp = _number(_spec(specs, "tdp_rating"))
+
+    def spec_strength(self):
+        """Raw performance figure from the specs, None when they say nothing."""
+        specs = self.specs
+        if self.category == "CPU":
+            cores = _number(_spec(specs, "cores"))
+            clock = _number(_spec(specs, "boost_clock", "base_clock")) or 3.5
+            return cores * clock if cores else None
+        if self.category == "GPU":
+            memory = _capacity_gb(_spec(specs, "memory", "vram"))
+            clock = _number(_spec(specs, "boost_clock", "base_clock")) or 2000
+            return memory * clock / 1000 if memory else None
+        if self.category == "RAM":
+            capacity = _capacity_gb(_spec(specs, "capacity"))
+            speed = _number(_spec(specs, "speed")) or 3200
+            return capacity * speed / 1000 if capacity else None
+        if self.category == "Storage":
+            capacity = _capacity_gb(_spec(specs, "capacity"))
+            interface = f"{_spec(specs, 'interface') or ''} {_spec(specs, 'type') or ''}".upper()
+            return capacity * (2 if "NVME" in interface or "PCIE" in interface else 1) if capacity else None
+        if self.category == "PSU":
+            # Wattage is a constraint, not a merit: a bigger PSU than the
+            # build needs is not a better build
+            efficiency = str(_spec(specs, "efficiency") or "").upper()
+            for rating, strength in (("TITANIUM", 6), ("PLATINUM", 5), ("GOLD", 4),
+                                     ("SILVER", 3), ("BRONZE", 2), ("80", 1)):
+                if rating in efficiency:
+                    return strength
+            return None
+        return None
+
+    def is_checkable(self):
+        # Parts the core constraints cannot be verified for are left out
+        if self.category in ("CPU", "Motherboard"):
+            return self.socket is not None
+        if self.category == "RAM":
+            return bool(self.memory_types)
+        if self.category == "PSU":
+            return self.wattage is not None
+        return True
+
+    def to_product(self):
+        return {
+            "product_id": self.product_id,
+            "name": self.name,
+            "price": self.price,
+            "category": self.category,
+            "quantity": 1
+        }
+
+    def to_dict(self):
+        return {
+            "product_id": self.product_id,
+            "category": self.category,
+            "name": self.name,
+            "price": self.price,
+            "specs": self.specs
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["product_id"], data["category"], data["name"], data["price"], data["specs"])
+
+
+def required_wattage(cpu, gpu):
+    cpu_tdp = (cpu.tdp if cpu and cpu.tdp else 95)
+    gpu_tdp = (gpu.tdp if gpu.tdp else 200) if gpu else 0
+    return math.ceil((cpu_tdp + gpu_tdp + BASE_SYSTEM_WATTS) * PSU_HEADROOM)
+
+
+def check_part(category, part, chosen):
+    """Why part cannot join the parts already chosen, or None if it fits.
+
+    Only checks against categories earlier in BUILD_CATEGORIES, so a build
+    assembled in that order is verified exactly once per pair.
+    """
+    cpu = chosen.get("CPU")
+    motherboard = chosen.get("Motherboard")
+
+    if category == "Motherboard" and cpu and cpu.socket != part.socket:
+        return f"Socket {part.socket} của bo mạch chủ không khớp CPU {cpu.socket}"
+
+    if category == "RAM" and motherboard and motherboard.memory_types and not (part.memory_types & motherboard.memory_types):
+        return f"RAM {'/'.join(sorted(part.memory_types))} không được bo mạch chủ hỗ trợ ({'/'.join(sorted(motherboard.memory_types))})"
+
+    if category == "GPU" and part is None and cpu and not cpu.integrated_graphics:
+        return "CPU không có đồ họa tích hợp nên cần card đồ họa rời"
+
+    if category == "PSU":
+        needed = required_wattage(cpu, chosen.get("GPU"))
+        if part.wattage < needed:
+            return f"Nguồn {part.wattage:.0f}W thấp hơn mức cần thiết {needed}W"
+
+    if category == "Case" and motherboard and motherboard.form_factors and part.form_factors:
+        if not (motherboard.form_factors & part.form_factors):
+            return "Vỏ máy không hỗ trợ kích thước bo mạch chủ"
+
+    if category == "Cooling":
+        if part is None:
+            if cpu and cpu.tdp and cpu.tdp > STOCK_COOLER_MAX_TDP:
+                return f"CPU {cpu.tdp:.0f}W cần tản nhiệt rời"
+            return None
+        if cpu and cpu.socket and part.cooler_sockets and cpu.socket not in part.cooler_sockets:
+            return f"Tản nhiệt không hỗ trợ socket {cpu.socket}"
+        if cpu and cpu.tdp and part.cooler_tdp and part.cooler_tdp < cpu.tdp:
+            return f"Tản nhiệt {part.cooler_tdp:.0f}W không đủ cho CPU {cpu.tdp:.0f}W"
+
+    return None
+
+
+def check_compatibility(parts):
+    """All compatibility problems of a finished build (category -> part)."""
+    issues = []
+    chosen = {}
+    for category in BUILD_CATEGORIES:
+        if category not in parts:
+            continue
+        part = parts[category]
+        if part is not None or category in ("GPU", "Cooling"):
+            issue = check_part(category, part, chosen)
+            if issue:
+                issues.append(issue)
+        chosen[category] = part
+    return issues
+
+
+def purpose_weights(purposes):
+    purposes = [p for p in purposes if p in PURPOSE_WEIGHTS] or ["general"]
+    return {category: sum(PURPOSE_WEIGHTS[p][category] for p in purposes) / len(purposes)
+            for category in BUILD_CATEGORIES}
+
+
+class PCBuild:
+    def __init__(self, parts, budget, purposes, score):
+        self.parts = parts
+        self.budget = budget
+        self.purposes = purposes
+        self.score = score
+
+    @property
+    def total_price(self):
+        return sum(part.price for part in self.parts.values() if part is not None)
+
+    def products(self):
+        return [self.parts[category].to_product() for category in BUILD_CATEGORIES
+                if self.parts.get(category) is not None]
+
+    def issues(self):
+        return check_compatibility(self.parts)
+
+    def to_dict(self):
+        """JSON-safe form, for keeping the build in the session state."""
+        return {
+            "parts": {category: part.to_dict() if part is not None else None
+                      for category, part in self.parts.items()},
+            "budget": self.budget,
+            "purposes": self.purposes,
+            "score": self.score
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        parts = {category: BuildPart.from_dict(part) if part is not None else None
+                 for category, part in data["parts"].items()}
+        return cls(parts, data["budget"], data["purposes"], data["score"])
+
+
+# Ways a customer asks to change one part of a build
+EDIT_DIRECTIONS = ("cheaper", "better", "other")
+# "Cheaper" replacements aim for at most this share of the current price
+CHEAPER_STEP = 0.9
+
+
+def replacement_band(build, category, direction):
+    """Price range (USD) a replacement for category may come from."""
+    current = build.parts.get(category)
+    current_price = current.price if current is not None else 0.0
+    if direction == "cheaper":
+        return (0.0, round(current_price, 2))
+    # Whatever the rest of the build leaves of the budget
+    return (0.0, round(build.budget - build.total_price + current_price, 2))
+
+
+class BuildOptimizer:
+    """Picks the compatible parts set with the best purpose-weighted score.
+
+    Branch-and-bound over BUILD_CATEGORIES: each level picks one part (or
+    none, where allowed) and compatibility is checked against the parts
+    already picked. A branch is cut when a price-bucket DP over the
+    remaining categories shows it cannot beat the best build found within
+    the budget left. Candidate lists are first reduced to their price/quality
+    Pareto front per compatibility group, which keeps the search to a few
+    thousand nodes for a full catalog.
+    """
+
+    def __init__(self, max_per_group=8, max_per_category=40, price_buckets=400, max_nodes=200_000):
+        self.max_per_group = max_per_group
+        self.price_buckets = price_buckets
+        self.max_per_category = max_per_category
+        self.max_nodes = max_nodes
+
+    def _assign_quality(self, parts):
+        # Half from the parts' own specs, half from price rank in the
+        # category; the catalog has no benchmark scores
+        if not parts:
+            return
+        by_price = sorted(parts, key=lambda part: part.price)
+        rank = {id(part): (i + 1) / len(by_price)
+                for i, part in enumerate(by_price)}
+        strengths = [part.spec_strength() for part in parts]
+        best = max((s for s in strengths if s), default=None)
+        for part, strength in zip(parts, strengths):
+            if best and strength:
+                part.quality = 0.5 * strength / best + 0.5 * rank[id(part)]
+            else:
+                part.quality = rank[id(part)]
+
+    def _group_key(self, part):
+        if part.category == "CPU":
+            return (part.socket, part.integrated_graphics, (part.tdp or 0) > STOCK_COOLER_MAX_TDP)
+        if part.category == "Motherboard":
+            return (part.socket, frozenset(part.memory_types), frozenset(part.form_factors))
+        if part.category == "RAM":
+            return frozenset(part.memory_types)
+        if part.category == "GPU":
+            return round((part.tdp or 200) / 50)
+        if part.category == "PSU":
+            return round(part.wattage / 100)
+        if part.category == "Case":
+            return frozenset(part.form_factors)
+        if part.category == "Cooling":
+            return (frozenset(part.cooler_sockets), round((part.cooler_tdp or 0) / 50))
+        return None
+
+    def _prune(self, parts):
+        groups = {}
+        for part in parts:
+            groups.setdefault(self._group_key(part), []).append(part)
+        per_group = max(2, min(self.max_per_group,
+                               self.max_per_category // max(len(groups), 1)))
+
+        kept = []
+        for group in groups.values():
+            # Pareto front: walking up in price, keep a part only if it beats
+            # every cheaper one in quality
+            front = []
+            for part in sorted(group, key=lambda part: (part.price, -part.quality)):
+                if not front or part.quality > front[-1].quality:
+                    front.append(part)
+            # Spread over the whole price range, so tight budgets keep their
+            # cheap options and large ones their best
+            if len(front) > per_group:
+                front = [front[round(i * (len(front) - 1) / (per_group - 1))]
+                         for i in range(per_group)]
+            kept.extend(front)
+        return sorted(kept, key=lambda part: -part.quality)
+
+    def optimize(self, candidates, budget, purposes):
+        """candidates: category -> list of BuildPart; budget in USD."""
+        weights = purpose_weights(purposes)
+
+        options = {}
+        for category in BUILD_CATEGORIES:
+            parts = [part for part in candidates.get(category, [])
+                     if part.price <= budget and part.is_checkable()]
+            self._assign_quality(parts)
+            options[category] = self._prune(parts)
+            if category == "GPU" and weights["GPU"] < OPTIONAL_GPU_WEIGHT:
+                options[category].append(None)
+            elif category == "Cooling":
+                options[category].append(None)
+
+            if not options[category]:
+                print(f"Build optimizer: không có {category} phù hợp trong ngân sách")
+                return None
+
+        def value(category, part):
+            return weights[category] * part.quality if part is not None else 0.0
+
+        def price(part):
+            return part.price if part is not None else 0.0
+
+        # Upper bound for the search: a DP over price buckets of the best
+        # value the remaining categories can add within a remaining budget,
+        # ignoring compatibility. Prices are rounded down to whole buckets,
+        # so the bound never cuts off a feasible build.
+        unit = budget / self.price_buckets
+        levels = len(BUILD_CATEGORIES)
+        infeasible = float("-inf")
+        bound = [[0.0] * (self.price_buckets + 1)
+                 for _ in range(levels + 1)]
+        for i in range(levels - 1, -1, -1):
+            category = BUILD_CATEGORIES[i]
+            priced = [(int(price(part) // unit), value(category, part))
+                      for part in options[category]]
+            row, next_row = bound[i], bound[i + 1]
+            for b in range(self.price_buckets + 1):
+                row[b] = max((part_value + next_row[b - units] for units, part_value in priced
+                              if units <= b), default=infeasible)
+
+        best = {"score": -1.0, "cost": 0.0, "parts": None}
+        nodes = [0]
+
+        def search(level, chosen, score, cost):
+            nodes[0] += 1
+            if nodes[0] > self.max_nodes:
+                return
+            if level == len(BUILD_CATEGORIES):
+                if score > best["score"] + 1e-9 or (abs(score - best["score"]) <= 1e-9 and cost < best["cost"]):
+                    best.update(score=score, cost=cost, parts=dict(chosen))
+                return
+            remaining = min(int((budget - cost) // unit), self.price_buckets)
+            if score + bound[level][remaining] <= best["score"] + 1e-9:
+                return
+
+            category = BUILD_CATEGORIES[level]
+            for part in options[category]:
+                new_cost = cost + price(part)
+                if new_cost > budget:
+                    continue
+                if check_part(category, part, chosen):
+                    continue
+                chosen[category] = part
+                search(level + 1, chosen, score +
+                       value(category, part), new_cost)
+                del chosen[category]
+
+        search(0, {}, 0.0, 0.0)
+        print(
+            f"Build optimizer: {nodes[0]} nút tìm kiếm, điểm {best['score']:.3f}")
+
+        if best["parts"] is None:
+            return None
+        return PCBuild(best["parts"], budget, purposes, best["score"])
+
+    def replace_part(self, build, category, candidates, direction="other"):
+        """build with only category swapped, or None if nothing qualifies.
+
+        direction is one of EDIT_DIRECTIONS. The replacement must keep the
+        whole build compatible and within its budget; "cheaper" takes the
+        best part that costs clearly less, "better" the best part of higher
+        quality and "other" the part closest in price.
+        """
+        current = build.parts.get(category)
+        budget_left = build.budget - build.total_price + \
+            (current.price if current is not None else 0.0)
+
+        parts = [part for part in candidates if part.is_checkable()
+                 and (current is None or part.product_id != current.product_id)]
+        # Rate the current part on the same scale as its replacements
+        self._assign_quality(parts + ([current] if current is not None else []))
+
+        options = []
+        for part in parts:
+            if part.price > budget_left:
+                continue
+            if current is not None and direction == "cheaper" and part.price >= current.price:
+                continue
+            if current is not None and direction == "better" and part.quality <= current.quality:
+                continue
+            if check_compatibility({**build.parts, category: part}):
+                continue
+            options.append(part)
+
+        if not options:
+            return None
+        if direction == "cheaper" and current is not None:
+            # A noticeably cheaper part where there is one, not the best
+            # part a few dollars under the current one
+            options = [part for part in options
+                       if part.price <= current.price * CHEAPER_STEP] or options
+        if direction == "other" and current is not None:
+            chosen = min(options, key=lambda part: (
+                abs(part.price - current.price), -part.quality))
+        else:
+            chosen = max(options, key=lambda part: part.quality)
+        return PCBuild({**build.parts, category: chosen}, build.budget, build.purposes, None)
+
+
+def price_bands(budget, purposes):
+    """Price range (USD) worth fetching per category for a budget.
+
+    The ceiling follows the category's weight, so a gaming build looks at
+    GPUs up to 60% of the budget but at cases up to ~15%. The floor skips
+    bargain-bin parts for the categories that carry the build.
+    """
+    weights = purpose_weights(purposes)
+    bands = {}
+    for category in BUILD_CATEGORIES:
+        weight = weights[category]
+        low = budget * weight * 0.2 if weight >= 0.1 else 0.0
+        high = budget * min(0.6, 2 * weight + 0.05)
+        bands[category] = (round(low, 2), round(high, 2))
+    return bands
+
+
+def _sql_number(expression):
+    # First number in a free-text spec value ("125W", "5.2 GHz"), else NULL
+    return f"NULLIF(substring({expression} from '[0-9]+(?:[.][0-9]+)?'), '')::numeric"
+
+
+# Spec figure each category's candidates are ranked by in SQL; the same
+# figures BuildPart.spec_strength() derives in Python
+SPEC_SCORE_SQL = f"""
+    CASE c.name
+        WHEN 'CPU' THEN {_sql_number("p.specs->>'cores'")}
+            * COALESCE({_sql_number("COALESCE(p.specs->>'boost_clock', p.specs->>'base_clock')")}, 3.5)
+        WHEN 'GPU' THEN {_sql_number("COALESCE(p.specs->>'memory', p.specs->>'vram')")}
+            * COALESCE({_sql_number("COALESCE(p.specs->>'boost_clock', p.specs->>'base_clock')")}, 2000) / 1000
+        WHEN 'RAM' THEN {_sql_number("p.specs->>'capacity'")}
+            * COALESCE({_sql_number("p.specs->>'speed'")}, 3200) / 1000
+        WHEN 'Storage' THEN {_sql_number("p.specs->>'capacity'")}
+            * CASE WHEN p.specs->>'capacity' ILIKE '%%TB%%' THEN 1000 ELSE 1 END
+            * CASE WHEN concat(p.specs->>'interface', p.specs->>'type') ~* 'nvme|pcie' THEN 2 ELSE 1 END
+        WHEN 'PSU' THEN CASE
+            WHEN p.specs->>'efficiency' ILIKE '%%titanium%%' THEN 6
+            WHEN p.specs->>'efficiency' ILIKE '%%platinum%%' THEN 5
+            WHEN p.specs->>'efficiency' ILIKE '%%gold%%' THEN 4
+            WHEN p.specs->>'efficiency' ILIKE '%%silver%%' THEN 3
+            WHEN p.specs->>'efficiency' ILIKE '%%bronze%%' THEN 2
+            ELSE 1 END
+    END
+"""
+
+# Top-N in-stock products per category (and per socket, so every CPU
+# platform keeps candidates) inside each category's price band, in one
+# round trip. Served by idx_products_category_price_in_stock.
+BUILD_CANDIDATES_SQL = f"""
+    WITH bands AS (
+        SELECT * FROM unnest(%s::text[], %s::numeric[], %s::numeric[])
+            AS b(category, min_price, max_price)
+    ),
+    ranked AS (
+        SELECT p.id, c.name AS category, p.name, p.price, p.specs,
+               ROW_NUMBER() OVER (
+                   PARTITION BY c.name, upper(replace(p.specs->>'socket', ' ', ''))
+                   ORDER BY {SPEC_SCORE_SQL} DESC NULLS LAST, p.price ASC
+               ) AS rank
+        FROM bands b
+        JOIN categories c ON c.name = b.category
+        JOIN products p ON p.category_id = c.id
+        WHERE p.stock > 0 AND p.price BETWEEN b.min_price AND b.max_price
+    )
+    SELECT id, category, name, price, specs
+    FROM ranked
+    WHERE rank <= %s
+    ORDER BY category, rank
+"""
+
+
+def load_build_candidates(pool, budget, purposes, per_category=None, bands=None):
+    """Build candidates per category from Postgres in a single query.
+
+    bands (category -> (min, max) USD) overrides price_bands() and limits
+    the query to those categories.
+    """
+    if per_category is None:
+        from src.config import BUILD_CANDIDATES_PER_CATEGORY
+        per_category = BUILD_CANDIDATES_PER_CATEGORY
+
+    bands = bands or price_bands(budget, purposes)
+    rows = pool.query(BUILD_CANDIDATES_SQL, (
+        list(bands.keys()),
+        [low for low, _ in bands.values()],
+        [high for _, high in bands.values()],
+        per_category
+    ))
+
+    candidates = {}
+    for product_id, category, name, price, specs in rows:
+        candidates.setdefault(category, []).append(
+            BuildPart(product_id, category, name, price, specs))
+    return candidates
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, one worker per directory
+    fcntl = None
+
+
+def embedding_key(model, text):
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Content-addressed vector store on disk.
+
+    Vectors are appended to one float32 file per dimension and read back
+    through numpy.memmap, so lookups never load the whole file. A SQLite
+    table maps each key to its (dimensions, row). Appends hold an exclusive
+    flock on the vector file from reading its size until the rows are
+    indexed, so every worker process can share one directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps = {}
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(os.path.join(
+            directory, "index.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key TEXT PRIMARY KEY,
+            dimensions INTEGER NOT NULL,
+            row INTEGER NOT NULL
+        )
+        """)
+        self._conn.commit()
+
+        self._index = {}
+        for key, dimensions, row in self._conn.execute("SELECT key, dimensions, row FROM embeddings"):
+            # Rows past the end of the file were indexed but never flushed
+            if row < self._row_count(dimensions):
+                self._index[key] = (dimensions, row)
+
+    def _vector_path(self, dimensions):
+        return os.path.join(self.directory, f"vectors-{dimensions}.f32")
+
+    def _row_count(self, dimensions):
+        path = self._vector_path(dimensions)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // (dimensions * 4)
+
+    def _vectors(self, dimensions, min_rows):
+        vectors = self._maps.get(dimensions)
+        if vectors is None or len(vectors) < min_rows:
+            # The file grew since it was mapped
+            vectors = np.memmap(self._vector_path(dimensions), dtype=np.float32, mode="r",
+                                shape=(self._row_count(dimensions), dimensions))
+            self._maps[dimensions] = vectors
+        return vectors
+
+    def __len__(self):
+        return len(self._index)
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                location = self._index.get(key)
+                if location is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                dimensions, row = location
+                found[key] = np.array(
+                    self._vectors(dimensions, row + 1)[row])
+        return found
+
+    def put_many(self, items):
+        by_dimensions = {}
+        for key, vector in items.items():
+            vector = np.asarray(vector, dtype=np.float32)
+            by_dimensions.setdefault(len(vector), []).append((key, vector))
+
+        with self._lock:
+            for dimensions, entries in by_dimensions.items():
+                entries = [(key, vector) for key, vector in entries
+                           if key not in self._index]
+                if not entries:
+                    continue
+
+                row_bytes = dimensions * 4
+                with open(self._vector_path(dimensions), "ab") as f:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                    try:
+                        # Another process may have appended since this one
+                        # last looked, so the rows are counted under the lock
+                        size = os.fstat(f.fileno()).st_size
+                        first_row = size // row_bytes
+                        if size % row_bytes:
+                            # A torn row from a writer that died mid-append
+                            os.ftruncate(f.fileno(), first_row * row_bytes)
+                        f.write(np.stack([vector for _, vector in entries]).tobytes())
+                        f.flush()
+
+                        rows = [(key, dimensions, first_row + i)
+                                for i, (key, _) in enumerate(entries)]
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO embeddings (key, dimensions, row) VALUES (?, ?, ?)", rows)
+                        self._conn.commit()
+                    finally:
+                        if fcntl is not None:
+                            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                for key, dimensions, row in rows:
+                    self._index[key] = (dimensions, row)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stored": len(self._index),
+            }
+
+    def close(self):
+        with self._lock:
+            self._maps.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Wraps a Chroma embedding function with an EmbeddingStore.
+
+    A batch is looked up in one pass and only the texts missing from the
+    store (deduplicated) go to the wrapped function, in a single call.
+    """
+
+    def __init__(self, embedding_function, model, store):
+        self.embedding_function = embedding_function
+        self.model = model
+        self.store = store
+
+    def __call__(self, input):
+        keys = [embedding_key(self.model, text) for text in input]
+        found = self.store.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embedding_function(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.store.put_many(computed)
+            found.update({key: np.asarray(vector, dtype=np.float32)
+                          for key, vector in computed.items()})
+
+        return [found[key] for key in keys]
+
+
+_embedding_store = None
+_embedding_store_lock = threading.Lock()
+
+
+def get_embedding_store():
+    global _embedding_store
+    if _embedding_store is None:
+        from src.config import EMBEDDING_CACHE_DIR
+        if not EMBEDDING_CACHE_DIR:
+            return None
+        with _embedding_store_lock:
+            if _embedding_store is None:
+                _embedding_store = EmbeddingStore(EMBEDDING_CACHE_DIR)
+    return _embedding_store
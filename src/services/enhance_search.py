@@ -1,15 +1,11 @@
-from src.database.postgres import PostgresDB
-from src.database.chroma import ChromaDB
-from src.services.reranking import RerankerService
-from src.services.vietnamese_llm_helper import VietnameseLLMHelper
+from src.services.resource_registry import get_chroma_db, get_reranker, get_vi_helper
 
 
 class EnhancedSearchService:
     def __init__(self):
-        self.postgres_db = PostgresDB().connect()
-        self.chroma_db = ChromaDB().connect()
-        self.vi_helper = VietnameseLLMHelper()
-        self.reranker = RerankerService()
+        self.chroma_db = get_chroma_db("computer_parts")
+        self.vi_helper = get_vi_helper()
+        self.reranker = get_reranker()
 
     def search(self, query, language="en", n_results=5, filters=None):
         try:
@@ -48,6 +44,36 @@ class EnhancedSearchService:
                 query, n_results=n_results, filter_dict=filters)
             return self._format_product_names(base_results)
 
+    async def search_async(self, query, language="en", n_results=5, filters=None):
+        try:
+            enhanced_query = query
+            if language == "vi":
+                enhanced_query = await self.vi_helper.enhance_vietnamese_query_async(query)
+                print(f"Enhanced query: {enhanced_query}")
+
+            initial_results = await self.chroma_db.search_async(
+                enhanced_query,
+                n_results=n_results * 3,
+                filter_dict=filters
+            )
+
+            reranked_results = await self.reranker.rerank_async(
+                enhanced_query,
+                initial_results,
+                n_results=n_results * 2
+            )
+
+            deduped_results = self._deduplicate_products(
+                reranked_results, n_results)
+
+            return self._format_product_names(deduped_results)
+
+        except Exception as e:
+            print(f"Search error: {e}")
+            base_results = await self.chroma_db.search_async(
+                query, n_results=n_results, filter_dict=filters)
+            return self._format_product_names(base_results)
+
     def _deduplicate_products(self, results, n_results=5):
         if not results or 'metadatas' not in results or not results['metadatas'][0]:
             return results
@@ -100,5 +126,6 @@ class EnhancedSearchService:
         return results
 
     def close(self):
-        self.postgres_db.close()
-        self.chroma_db.close()
+        # The Chroma client is shared by every session; registry.aclose()
+        # closes it at shutdown
+        pass
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+
+class BackgroundEventLoop:
+    """One asyncio loop running for the life of the process in its own thread.
+
+    Coroutines from any thread are submitted with run_coroutine_threadsafe.
+    Because the loop never closes, the AsyncOpenAI clients keep their HTTP
+    connection pools (and TLS sessions) across messages and sessions.
+    """
+
+    def __init__(self, name="query-event-loop"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+
+            self.loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(self.loop)
+                self.loop.call_soon(ready.set)
+                self.loop.run_forever()
+
+            self._thread = threading.Thread(
+                target=run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+        return self
+
+    def submit(self, coro):
+        """Schedule coro on the loop and return a concurrent.futures.Future."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Block the calling thread until coro finishes on the loop."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        with self._lock:
+            if self.loop is None:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self.loop = None
+            self._thread = None
+
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop():
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                _background_loop = BackgroundEventLoop().start()
+    return _background_loop
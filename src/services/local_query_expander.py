@@ -0,0 +1,299 @@
+import re
+import threading
+from src.services.price_utils import parse_usd_from_vnd
+from src.services.query_cache import normalize_query
+from src.services.vietnamese_llm_helper import CATEGORY_TRANSLATIONS, COMMON_BRANDS, SPEC_MAPPINGS
+
+# Usage and intent phrases that are not product data but show up in most queries
+USAGE_TERMS = {
+    "chơi game": "gaming performance",
+    "game": "gaming",
+    "gaming": "gaming",
+    "đồ họa": "graphics design rendering",
+    "thiết kế": "design",
+    "render": "rendering",
+    "văn phòng": "office productivity",
+    "lập trình": "programming development",
+    "streaming": "streaming",
+    "stream": "streaming",
+    "giá rẻ": "budget affordable",
+    "rẻ": "budget affordable",
+    "tầm trung": "mid-range",
+    "cao cấp": "high-end premium",
+    "tốt nhất": "best",
+    "mạnh nhất": "most powerful high performance",
+    "mạnh": "powerful high performance",
+    "hiệu năng": "performance",
+    "tốt": "good",
+    "yên tĩnh": "quiet low noise",
+    "tiết kiệm điện": "power efficient",
+    "hỗ trợ": "supports",
+    "phù hợp": "suitable",
+    "ngân sách": "budget",
+    "so sánh": "compare",
+    "tương thích": "compatible",
+    "bao nhiêu": "price",
+    "bảo hành": "warranty",
+}
+
+# Function words that carry no search meaning; they count as covered
+STOPWORDS = {
+    "toi", "minh", "em", "anh", "chi", "ban", "shop", "can", "muon", "mua", "tim",
+    "cho", "nao", "co", "khong", "loai", "va", "cua", "voi", "de", "mot", "cai",
+    "la", "gi", "hay", "nhe", "a", "oi", "giup", "tu", "van", "nen", "thi", "nhung",
+    "cac", "nay", "do", "the", "ve", "dang", "duoc", "hon", "nhat", "hoac", "gia",
+    "nhieu", "con", "san", "pham", "chiec", "dung", "it", "ngon", "nhu",
+}
+
+# Tokens that are already a spec value the catalog documents use verbatim
+SPEC_VALUE_PATTERN = re.compile(
+    r"^(?:\d+(?:gb|tb|mb|mhz|ghz|hz|w|mm|cm|inch|p|k)|g?ddr\d|pcie\d?|nvme|sata|atx|matx|itx|am\d|lga\d+)$")
+
+_AMOUNT = r"\d+(?:[.,]\d+)?"
+# "5tr5" is 5.5 million; "k" only follows amounts of up to three digits
+# ("500k"), so CPU models like 9900K and 14600K are not prices
+_UNIT = r"(?:(?:trieu|tr)(?:\d{1,3}(?!\d))?|m|nghin|ngan|(?<!\d{4})k)(?:\s*ruoi)?(?:\s*(?:vnd|dong|d))?"
+_PRICE_PATTERN = (
+    rf"(?P<range>(?:tu\s+)?(?P<low>{_AMOUNT})\s*(?:trieu|tr|m)?\s*(?:-|den|toi)\s*(?P<high>{_AMOUNT})\s*(?P<range_unit>{_UNIT}))"
+    rf"|(?P<under>(?:duoi|toi da|khong qua|<)\s*(?P<under_amount>{_AMOUNT})\s*(?P<under_unit>{_UNIT}))"
+    rf"|(?P<over>(?:tren|hon|>)\s*(?P<over_amount>{_AMOUNT})\s*(?P<over_unit>{_UNIT}))"
+    rf"|(?P<around>(?:(?:khoang|tam|gia|muc|tam gia)\s*)?(?P<around_amount>{_AMOUNT})\s*(?P<around_unit>{_UNIT}))"
+)
+
+
+def _vnd_multiplier(unit):
+    unit = unit.split()[0] if unit else ""
+    for prefix, multiplier in (("trieu", 1_000_000), ("tr", 1_000_000), ("m", 1_000_000),
+                               ("nghin", 1_000), ("ngan", 1_000), ("k", 1_000)):
+        if unit.startswith(prefix):
+            return multiplier
+    return 1_000_000
+
+
+def _to_usd(amount, unit):
+    value = float(amount.replace(",", "."))
+    fraction = re.match(r"(?:trieu|tr)(\d+)", unit or "")
+    if fraction:
+        value += int(fraction.group(1)) / 10 ** len(fraction.group(1))
+    vnd = value * _vnd_multiplier(unit)
+    if unit and "ruoi" in unit:
+        vnd += _vnd_multiplier(unit) / 2
+    return round(parse_usd_from_vnd(vnd))
+
+
+class ExpansionResult:
+    def __init__(self, query, coverage, categories, brands, price_range):
+        self.query = query
+        self.coverage = coverage
+        self.categories = categories
+        self.brands = brands
+        # (min_usd, max_usd), either side may be None
+        self.price_range = price_range
+
+    def __repr__(self):
+        return f"ExpansionResult(query={self.query!r}, coverage={self.coverage:.2f})"
+
+
+class LocalQueryExpander:
+    """Dictionary-driven Vietnamese -> English query expansion.
+
+    CATEGORY_TRANSLATIONS, COMMON_BRANDS, SPEC_MAPPINGS, USAGE_TERMS and VND
+    price phrases are compiled into a single regex over the normalized
+    (lowercase, diacritics-free) query. coverage is the share of meaningful
+    query tokens the matcher understood; callers fall back to the LLM when it
+    is low.
+    """
+
+    def __init__(self):
+        self.terms = {}
+        self._add_terms()
+
+        term_patterns = [
+            r"\s+".join(re.escape(part) for part in term.split())
+            for term in sorted(self.terms, key=len, reverse=True)
+        ]
+        self.pattern = re.compile(
+            rf"(?<!\w)(?:{_PRICE_PATTERN}|(?P<term>{'|'.join(term_patterns)}))(?!\w)")
+
+    def _term(self, text):
+        normalized = normalize_query(text)
+        if len(normalized) < 2:
+            return None
+        return self.terms.setdefault(normalized, {
+            "categories": [],
+            "brands": [],
+            "specs": {},
+            "usage": None
+        })
+
+    def _add_terms(self):
+        for category, terms in CATEGORY_TRANSLATIONS.items():
+            for text in terms + [category]:
+                entry = self._term(text)
+                if entry is not None and category not in entry["categories"]:
+                    entry["categories"].append(category)
+
+        for category, brands in COMMON_BRANDS.items():
+            for brand in brands:
+                entry = self._term(brand)
+                if entry is not None:
+                    if brand not in entry["brands"]:
+                        entry["brands"].append(brand)
+                    entry.setdefault("brand_categories", []).append(category)
+
+        for category, specs in SPEC_MAPPINGS.items():
+            for spec_name, spec_terms in specs.items():
+                for text in spec_terms:
+                    entry = self._term(text)
+                    if entry is not None:
+                        entry["specs"][category] = spec_name.replace("_", " ")
+
+        for text, english in USAGE_TERMS.items():
+            entry = self._term(text)
+            if entry is not None:
+                entry["usage"] = english
+
+        brand_names = {normalize_query(brand)
+                       for brands in COMMON_BRANDS.values() for brand in brands}
+        for text, entry in self.terms.items():
+            # "CPU Intel" is a category term that also names a brand
+            for word in text.split():
+                if entry["categories"] and word in brand_names and word not in entry["brands"]:
+                    entry["brands"].append(word.upper() if len(
+                        word) <= 3 else word.capitalize())
+
+        # English synonyms from the category table double as the expansion,
+        # minus brand-qualified ones so "CPU Intel" does not add "AMD"
+        self.category_english = {}
+        for category, terms in CATEGORY_TRANSLATIONS.items():
+            words = [category] + [t for t in terms if t.isascii() and not any(
+                word in brand_names for word in normalize_query(t).split())]
+            seen = set()
+            self.category_english[category] = " ".join(
+                w for w in words if not (w.lower() in seen or seen.add(w.lower())))
+
+    def _price_expansion(self, match):
+        if match.group("range"):
+            unit = match.group("range_unit")
+            low, high = _to_usd(match.group("low"), unit), _to_usd(
+                match.group("high"), unit)
+            return f"price range {low}-{high} USD", (low, high)
+        if match.group("under"):
+            amount = _to_usd(match.group("under_amount"),
+                             match.group("under_unit"))
+            return f"under {amount} USD budget", (None, amount)
+        if match.group("over"):
+            amount = _to_usd(match.group("over_amount"),
+                             match.group("over_unit"))
+            return f"above {amount} USD", (amount, None)
+        amount = _to_usd(match.group("around_amount"),
+                         match.group("around_unit"))
+        # A stated amount is usually a budget, so only cap it with some slack
+        return f"around {amount} USD", (None, round(amount * 1.2))
+
+    def expand(self, query):
+        text = normalize_query(query)
+        matches = list(self.pattern.finditer(text))
+
+        categories = []
+        brands = []
+        price_range = None
+        for match in matches:
+            entry = self.terms.get(match.group("term")) if match.group(
+                "term") else None
+            if entry is None:
+                continue
+            entry_categories = entry["categories"]
+            if not entry_categories and not entry["brands"] and len(entry["specs"]) == 1:
+                # Spec phrases owned by a single category ("tản nhiệt nước")
+                entry_categories = list(entry["specs"])
+            for category in entry_categories:
+                if category not in categories:
+                    categories.append(category)
+            for brand in entry["brands"]:
+                if brand not in brands:
+                    brands.append(brand)
+
+        # Brands such as "Kingston" pin down the category when nothing else did
+        if not categories:
+            for match in matches:
+                entry = self.terms.get(match.group("term")) if match.group(
+                    "term") else None
+                if entry and len(set(entry.get("brand_categories", []))) == 1:
+                    category = entry["brand_categories"][0]
+                    if category not in categories:
+                        categories.append(category)
+
+        pieces = []
+        covered_spans = []
+        for match in matches:
+            covered_spans.append(match.span())
+            if match.group("term") is None:
+                expansion, price_range = self._price_expansion(match)
+                pieces.append((match.start(), expansion))
+                continue
+
+            entry = self.terms[match.group("term")]
+            if entry["categories"]:
+                expansion = " ".join(
+                    [self.category_english[c] for c in entry["categories"]] + entry["brands"])
+            elif entry["brands"]:
+                expansion = " ".join(entry["brands"])
+            elif entry["specs"]:
+                specs = [entry["specs"][c]
+                         for c in categories if c in entry["specs"]]
+                expansion = " ".join(dict.fromkeys(
+                    specs or entry["specs"].values()))
+                if len(entry["specs"]) == 1:
+                    # "tản nhiệt nước" names its category too; without its
+                    # English terms the rest of the query ("CPU") decides
+                    owner = next(iter(entry["specs"]))
+                    expansion = f"{self.category_english[owner]} {expansion}"
+            else:
+                expansion = entry["usage"]
+            pieces.append((match.start(), expansion))
+
+        meaningful = 0
+        covered = 0
+        for token in re.finditer(r"\w+", text):
+            word = token.group(0)
+            in_match = any(start <= token.start() and token.end() <= end
+                           for start, end in covered_spans)
+            if in_match:
+                meaningful += 1
+                covered += 1
+            elif word in STOPWORDS:
+                continue
+            elif SPEC_VALUE_PATTERN.match(word):
+                meaningful += 1
+                covered += 1
+                pieces.append((token.start(), word.upper()
+                              if word.startswith(("ddr", "gddr")) else word))
+            else:
+                # Unknown words (model numbers, English) are kept verbatim
+                meaningful += 1
+                pieces.append((token.start(), word))
+
+        words = []
+        seen = set()
+        for _, piece in sorted(pieces, key=lambda item: item[0]):
+            for word in piece.split():
+                if word.lower() not in seen:
+                    seen.add(word.lower())
+                    words.append(word)
+
+        coverage = covered / meaningful if meaningful else 0.0
+        return ExpansionResult(" ".join(words), coverage, categories, brands, price_range)
+
+
+_local_expander = None
+_local_expander_lock = threading.Lock()
+
+
+def get_local_expander():
+    global _local_expander
+    if _local_expander is None:
+        with _local_expander_lock:
+            if _local_expander is None:
+                _local_expander = LocalQueryExpander()
+    return _local_expander
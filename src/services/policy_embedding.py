@@ -3,6 +3,7 @@ import uuid
 from typing import List, Dict, Tuple, Any, Optional
 import markdown
 from bs4 import BeautifulSoup
+from src.services.query_cache import bump_catalog_version
 
 
 class PolicyEmbeddingService:
@@ -228,6 +229,9 @@ class PolicyEmbeddingService:
                 print(
                     f"Added {i + 1}/{len(policy_chunks)} policy chunks to vector database")
 
+        if policy_chunks:
+            bump_catalog_version()
+
     def process_policy_file(self, policy_file_path: str) -> None:
         try:
             with open(policy_file_path, 'r', encoding='utf-8') as f:
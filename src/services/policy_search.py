@@ -1,29 +1,30 @@
-from src.database.chroma import ChromaDB
-from src.services.vietnamese_llm_helper import VietnameseLLMHelper
-from src.services.reranking import RerankerService
+from src.services.resource_registry import get_chroma_db, get_reranker, get_vi_helper
+from src.services.stage_timer import stage
+import asyncio
 from typing import Dict, List, Any, Optional
 
 
 class PolicySearchService:
     def __init__(self):
-        self.chroma_db = ChromaDB().connect(collection_name="policies")
-        self.vi_helper = VietnameseLLMHelper()
-        self.reranker = RerankerService()
+        self.chroma_db = get_chroma_db("policies")
+        self.vi_helper = get_vi_helper()
+        self.reranker = get_reranker()
+
+    def _policy_filter(self, filter_dict: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Set type filter to only search policy content
+        policy_filter = {"type": "policy"}
+        if filter_dict:
+            # Combine with provided filters
+            return {**filter_dict, **policy_filter}
+        return policy_filter
 
     def search_policy(self,
                       query: str,
                       language: str = "vi",
                       n_results: int = 2,
                       filter_dict: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        filter_dict = self._policy_filter(filter_dict)
         try:
-            # Set type filter to only search policy content
-            policy_filter = {"type": "policy"}
-            if filter_dict:
-                # Combine with provided filters
-                filter_dict = {**filter_dict, **policy_filter}
-            else:
-                filter_dict = policy_filter
-
             # Enhance query if in Vietnamese
             enhanced_query = query
             if language == "vi":
@@ -58,6 +59,81 @@ class PolicySearchService:
                 "error": str(e)
             }
 
+    async def search_policy_async(self,
+                                  query: str,
+                                  language: str = "vi",
+                                  n_results: int = 2,
+                                  filter_dict: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        filter_dict = self._policy_filter(filter_dict)
+        try:
+            enhanced_query = query
+            if language == "vi":
+                enhanced_query = await self.vi_helper.enhance_vietnamese_query_async(query)
+                print(f"Enhanced policy query: {enhanced_query}")
+
+            initial_results = await self.chroma_db.search_async(
+                enhanced_query,
+                n_results=n_results * 2,
+                filter_dict=filter_dict
+            )
+
+            reranked_results = await self.reranker.rerank_async(
+                enhanced_query,
+                initial_results,
+                n_results=n_results
+            )
+
+            return {
+                "results": reranked_results,
+                "original_query": query,
+                "enhanced_query": enhanced_query
+            }
+
+        except Exception as e:
+            print(f"Policy search error: {e}")
+            return {
+                "results": await self.chroma_db.search_async(query, n_results=n_results, filter_dict=filter_dict),
+                "original_query": query,
+                "enhanced_query": query,
+                "error": str(e)
+            }
+
+    def _clean_policy_text(self, text: str) -> str:
+        cleaned_text = text
+        cleaned_text = cleaned_text.replace("POLICY: ", "")
+        cleaned_text = cleaned_text.replace("PATH: ", "")
+
+        if "RELATED TERMS:" in cleaned_text:
+            cleaned_text = cleaned_text.split(
+                "RELATED TERMS:")[0]
+        if "COMMON QUESTIONS:" in cleaned_text:
+            cleaned_text = cleaned_text.split(
+                "COMMON QUESTIONS:")[0]
+
+        return cleaned_text.strip()
+
+    def _section_query(self, section_title: str, query_embedding) -> Dict[str, Any]:
+        return {
+            "query_embeddings": [query_embedding],
+            "n_results": 10,
+            "where": {"title": section_title}
+        }
+
+    def _section_query_text(self, search_results: Dict[str, Any]) -> str:
+        # The search query was embedded already, so in a request scope this
+        # costs no extra embedding call
+        return search_results.get("enhanced_query") or search_results.get("original_query") or "relevant content"
+
+    def _format_section(self, response: str, section_results) -> Optional[str]:
+        if section_results and len(section_results['documents'][0]) > 0:
+            all_texts = [self._clean_policy_text(chunk_text)
+                         for chunk_text in section_results['documents'][0]]
+
+            # Combine section chunks
+            policy_text = "\n\n".join(all_texts)
+            return response + policy_text
+        return None
+
     def format_policy_response(self, search_results: Dict[str, Any]) -> str:
         if not search_results.get("results") or not search_results["results"].get("documents"):
             return "Xin lỗi, tôi không tìm thấy thông tin chính sách liên quan đến câu hỏi của bạn."
@@ -76,56 +152,58 @@ class PolicySearchService:
         if "title" in top_metadata:
             response += f"### {top_metadata['title']}\n\n"
             try:
-                # Get the section path to identify the full section
-                section_path = top_metadata.get('path', '')
                 section_title = top_metadata.get('title', '')
 
                 if section_title:
-                    section_filter = {"title": section_title}
-
-                    section_results = self.chroma_db.collection.query(
-                        query_texts=["relevant content"],
-                        n_results=10,
-                        where=section_filter
-                    )
-
-                    if section_results and len(section_results['documents'][0]) > 0:
-                        all_texts = []
-
-                        for chunk_text in section_results['documents'][0]:
-                            cleaned_text = chunk_text
-                            cleaned_text = cleaned_text.replace("POLICY: ", "")
-                            cleaned_text = cleaned_text.replace("PATH: ", "")
-
-                            if "RELATED TERMS:" in cleaned_text:
-                                cleaned_text = cleaned_text.split(
-                                    "RELATED TERMS:")[0]
-                            if "COMMON QUESTIONS:" in cleaned_text:
-                                cleaned_text = cleaned_text.split(
-                                    "COMMON QUESTIONS:")[0]
-
-                            all_texts.append(cleaned_text.strip())
-
-                        # Combine section chunks
-                        policy_text = "\n\n".join(all_texts)
-                        return response + policy_text
+                    with stage("ann"):
+                        query_embedding = self.chroma_db.embed_query(
+                            self._section_query_text(search_results))
+                        section_results = self.chroma_db.collection.query(
+                            **self._section_query(section_title, query_embedding))
+
+                    section_text = self._format_section(
+                        response, section_results)
+                    if section_text is not None:
+                        return section_text
             except Exception as e:
                 print(f"Error retrieving full section: {e}")
 
-        policy_text = top_document
+        return response + self._clean_policy_text(top_document)
 
-        policy_text = policy_text.replace("POLICY: ", "")
-        policy_text = policy_text.replace("PATH: ", "")
+    async def format_policy_response_async(self, search_results: Dict[str, Any]) -> str:
+        if not search_results.get("results") or not search_results["results"].get("documents"):
+            return "Xin lỗi, tôi không tìm thấy thông tin chính sách liên quan đến câu hỏi của bạn."
 
-        if "RELATED TERMS:" in policy_text:
-            policy_text = policy_text.split("RELATED TERMS:")[0]
+        documents = search_results["results"]["documents"][0]
+        metadatas = search_results["results"]["metadatas"][0]
 
-        if "COMMON QUESTIONS:" in policy_text:
-            policy_text = policy_text.split("COMMON QUESTIONS:")[0]
+        top_document = documents[0]
+        top_metadata = metadatas[0]
+
+        response = ""
 
-        response += policy_text.strip()
+        if "title" in top_metadata:
+            response += f"### {top_metadata['title']}\n\n"
+            try:
+                section_title = top_metadata.get('title', '')
+
+                if section_title:
+                    with stage("ann"):
+                        query_embedding = await asyncio.to_thread(
+                            self.chroma_db.embed_query, self._section_query_text(search_results))
+                        section_results = await self.chroma_db.query_async(
+                            **self._section_query(section_title, query_embedding))
+
+                    section_text = self._format_section(
+                        response, section_results)
+                    if section_text is not None:
+                        return section_text
+            except Exception as e:
+                print(f"Error retrieving full section: {e}")
 
-        return response
+        return response + self._clean_policy_text(top_document)
 
     def close(self):
-        self.chroma_db.close()
+        # The Chroma client is shared by every session; registry.aclose()
+        # closes it at shutdown
+        pass
@@ -0,0 +1,238 @@
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    # "Card đồ họa  DƯỚI 5 triệu" and "card do hoa duoi 5 trieu" share a key
+    text = unicodedata.normalize("NFD", query.casefold())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    text = text.replace("đ", "d")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class SqliteTTLCache:
+    """LRU cache of strings with TTL in memory, backed by a SQLite table.
+
+    Holds query enhancements and LLM rerank results. Pass db_path=None (or
+    "") to keep the cache in memory only. Several caches can share one
+    database file by using different tables.
+
+    Writes are committed in batches, every commit_every writes or
+    commit_delay seconds after the first uncommitted one, whichever comes
+    first. Expired rows are deleted on open and every purge_every writes.
+    """
+
+    def __init__(self, db_path=None, max_size=1024, ttl_seconds=7 * 24 * 3600, table="enhanced_queries",
+                 commit_every=32, commit_delay=1.0, purge_every=1000):
+        if not re.fullmatch(r"[A-Za-z_]\w*", table):
+            raise ValueError(f"Invalid cache table name: {table}")
+        self.db_path = db_path
+        self.table = table
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.commit_every = commit_every
+        self.commit_delay = commit_delay
+        self.purge_every = purge_every
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pending = 0
+        self._writes = 0
+        self._commit_timer = None
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """)
+            self._conn.commit()
+            self.purge_expired()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row and not self._expired(row[1], now):
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._conn is None:
+                return
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, now))
+            self._pending += 1
+            self._writes += 1
+            if self.ttl_seconds is not None and self._writes % self.purge_every == 0:
+                self._delete_expired(now)
+
+            if self._pending >= self.commit_every:
+                self._commit()
+            elif self._commit_timer is None:
+                # An open write transaction blocks other processes' writes,
+                # so a quiet cache still commits soon
+                self._commit_timer = threading.Timer(
+                    self.commit_delay, self.flush)
+                self._commit_timer.daemon = True
+                self._commit_timer.start()
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _commit(self):
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        if self._conn is not None and self._pending:
+            self._conn.commit()
+            self._pending = 0
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def _delete_expired(self, now):
+        cursor = self._conn.execute(
+            f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,))
+        # Committed with the next batch
+        self._pending += 1
+        return cursor.rowcount
+
+    def purge_expired(self):
+        if self._conn is None or self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            deleted = self._delete_expired(time.time())
+            self._commit()
+            return deleted
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_size": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_enhancement_cache = None
+_enhancement_cache_lock = threading.Lock()
+
+
+def get_enhancement_cache():
+    global _enhancement_cache
+    if _enhancement_cache is None:
+        from src.config import QUERY_CACHE_PATH, QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+        with _enhancement_cache_lock:
+            if _enhancement_cache is None:
+                _enhancement_cache = SqliteTTLCache(
+                    db_path=QUERY_CACHE_PATH,
+                    max_size=QUERY_CACHE_SIZE,
+                    ttl_seconds=QUERY_CACHE_TTL
+                )
+                atexit.register(_enhancement_cache.flush)
+    return _enhancement_cache
+
+
+_rerank_caches = {}
+_rerank_cache_lock = threading.Lock()
+
+
+def get_rerank_cache(persistent=True):
+    """Cache of rerank results; in memory only unless persistent.
+
+    Only the LLM backend's rankings are worth a SQLite write: the local
+    backend ranks in about a millisecond, less than the write itself.
+    """
+    cache = _rerank_caches.get(persistent)
+    if cache is None:
+        from src.config import RERANK_CACHE_PATH, RERANK_CACHE_SIZE, RERANK_CACHE_TTL
+        with _rerank_cache_lock:
+            cache = _rerank_caches.get(persistent)
+            if cache is None:
+                cache = SqliteTTLCache(
+                    db_path=RERANK_CACHE_PATH if persistent else None,
+                    max_size=RERANK_CACHE_SIZE,
+                    ttl_seconds=RERANK_CACHE_TTL,
+                    table="rerank_results"
+                )
+                atexit.register(cache.flush)
+                _rerank_caches[persistent] = cache
+    return cache
+
+
+def close_caches():
+    """Commit and close the shared caches (before removing their files)."""
+    caches = list(_rerank_caches.values())
+    if _enhancement_cache is not None:
+        caches.append(_enhancement_cache)
+    for cache in caches:
+        cache.close()
+
+
+# Bumped whenever this process writes to the catalog, so cached rankings
+# over a changed candidate set are never served
+_catalog_generation = 0
+
+
+def bump_catalog_version():
+    global _catalog_generation
+    with _rerank_cache_lock:
+        _catalog_generation += 1
+
+
+def catalog_version():
+    from src.config import CATALOG_VERSION
+    return f"{CATALOG_VERSION}.{_catalog_generation}"
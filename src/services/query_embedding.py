@@ -0,0 +1,90 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Query vectors computed while handling the current user message, keyed by
+# (model, text). None outside request_embedding_scope(), in which case every
+# lookup embeds again.
+_request_embeddings = contextvars.ContextVar(
+    "request_embeddings", default=None)
+
+
+@contextmanager
+def request_embedding_scope():
+    """Share query embeddings between every Chroma query of one request.
+
+    The dict lives in a context variable, so asyncio tasks and
+    asyncio.to_thread calls started inside the scope see the same vectors.
+    Nested scopes reuse the outer one.
+    """
+    if _request_embeddings.get() is not None:
+        yield _request_embeddings.get()
+        return
+
+    embeddings = {}
+    token = _request_embeddings.set(embeddings)
+    try:
+        yield embeddings
+    finally:
+        _request_embeddings.reset(token)
+
+
+def embed_query(embedding_function, model, text):
+    embeddings = _request_embeddings.get()
+    key = (model, text)
+    if embeddings is not None and key in embeddings:
+        embedding = embeddings[key]
+        if not isinstance(embedding, Future):
+            return embedding
+        try:
+            # Started by prefetch_query_embedding(); wait for it
+            return embedding.result()
+        except Exception:
+            pass
+
+    embedding = embedding_function([text])[0]
+    if embeddings is not None:
+        embeddings[key] = embedding
+    return embedding
+
+
+_prefetch_executor = None
+_prefetch_executor_lock = threading.Lock()
+
+
+def _get_prefetch_executor():
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        with _prefetch_executor_lock:
+            if _prefetch_executor is None:
+                _prefetch_executor = ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix="embedding-prefetch")
+    return _prefetch_executor
+
+
+def prefetch_query_embedding(embedding_function, model, text):
+    """Start embedding text in the background for the current request.
+
+    A later embed_query() for the same text waits for this result instead of
+    embedding again. Returns the Future (cancel it if the vector turns out
+    to be unneeded), or None outside request_embedding_scope().
+    """
+    embeddings = _request_embeddings.get()
+    if embeddings is None:
+        return None
+    key = (model, text)
+    if key in embeddings:
+        return None
+
+    future = _get_prefetch_executor().submit(
+        lambda: embedding_function([text])[0])
+    embeddings[key] = future
+
+    def keep_vector(done):
+        if done.cancelled() or done.exception() is not None:
+            embeddings.pop(key, None)
+        else:
+            embeddings[key] = done.result()
+    future.add_done_callback(keep_vector)
+    return future
@@ -0,0 +1,134 @@
+import re
+from src.config import PRODUCT_CATEGORIES
+from src.services.query_cache import normalize_query
+
+# Expander categories that are stored under another name in Chroma
+CATEGORY_ALIASES = {
+    "SSD": "Storage",
+    "HDD": "Storage",
+}
+
+# Product lines from COMMON_BRANDS that are not the manufacturer stored in
+# the "brand" metadata field, so they must not become brand filters
+PRODUCT_LINES = {"Ryzen", "Core i3", "Core i5", "Core i7", "Core i9", "Xeon",
+                 "Pentium", "Celeron", "RTX", "GTX", "Radeon"}
+
+# GPUs are sold under board partner brands (ASUS, MSI...), not the chip vendor
+CHIP_VENDORS = {"NVIDIA", "AMD"}
+
+# Only CPUs are sold under these names; for coolers or mainboards "cho CPU
+# Intel" names the socket they must fit, not their manufacturer
+CPU_VENDORS = {"INTEL", "AMD"}
+
+_USD_AMOUNT = r"\$?\s*(\d+(?:[.,]\d+)?)\s*(?:usd|\$|do la|dollars?|do)\b"
+_USD_PATTERNS = [
+    ("range", re.compile(
+        rf"\$?\s*(\d+(?:[.,]\d+)?)\s*(?:-|den|toi|to)\s*{_USD_AMOUNT}")),
+    ("max", re.compile(rf"(?:duoi|under|below|toi da|khong qua|<)\s*{_USD_AMOUNT}")),
+    ("min", re.compile(rf"(?:tren|over|above|>)\s*{_USD_AMOUNT}")),
+    ("around", re.compile(rf"(?:around|about|khoang|tam|~)\s*{_USD_AMOUNT}")),
+]
+
+
+class QueryFilters:
+    def __init__(self, category=None, brands=None, min_price=None, max_price=None):
+        self.category = category
+        self.brands = brands or []
+        # Prices are USD, matching the "price" metadata in Chroma
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def is_empty(self):
+        return not (self.category or self.brands or self.min_price is not None or self.max_price is not None)
+
+    def to_where(self):
+        return build_where(self.category, self.brands, self.min_price, self.max_price)
+
+    def __repr__(self):
+        return (f"QueryFilters(category={self.category!r}, brands={self.brands!r}, "
+                f"min_price={self.min_price!r}, max_price={self.max_price!r})")
+
+
+def build_where(category=None, brands=None, min_price=None, max_price=None):
+    conditions = []
+    if category:
+        conditions.append({"category": category})
+    if brands:
+        # Chroma string matching is exact, cover the usual spellings
+        variants = []
+        for brand in brands:
+            for variant in (brand, brand.upper(), brand.capitalize(), brand.lower()):
+                if variant not in variants:
+                    variants.append(variant)
+        conditions.append({"brand": {"$in": variants}})
+    if min_price is not None:
+        conditions.append({"price": {"$gte": float(min_price)}})
+    if max_price is not None:
+        conditions.append({"price": {"$lte": float(max_price)}})
+    return merge_where(*conditions)
+
+
+def merge_where(*filters):
+    conditions = []
+    for where in filters:
+        if not where:
+            continue
+        if set(where.keys()) == {"$and"}:
+            conditions.extend(where["$and"])
+        elif len(where) > 1 and not any(key.startswith("$") for key in where):
+            conditions.extend({key: value} for key, value in where.items())
+        else:
+            conditions.append(where)
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def parse_usd_range(text):
+    for kind, pattern in _USD_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        values = [float(v.replace(",", ".")) for v in match.groups()]
+        if kind == "range":
+            return min(values), max(values)
+        if kind == "max":
+            return None, values[0]
+        if kind == "around":
+            return None, round(values[0] * 1.2)
+        return values[0], None
+    return None
+
+
+def parse_query_filters(query):
+    # Imported here to keep this module importable without compiling the
+    # expander's patterns
+    from src.services.local_query_expander import get_local_expander
+
+    expansion = get_local_expander().expand(query)
+
+    category = None
+    for detected in expansion.categories:
+        detected = CATEGORY_ALIASES.get(detected, detected)
+        if detected in PRODUCT_CATEGORIES:
+            category = detected
+            break
+
+    brands = []
+    for brand in expansion.brands:
+        if brand in PRODUCT_LINES:
+            continue
+        if category == "GPU" and brand.upper() in CHIP_VENDORS:
+            continue
+        if category not in (None, "CPU") and brand.upper() in CPU_VENDORS:
+            continue
+        brands.append(brand)
+
+    price_range = parse_usd_range(
+        normalize_query(query)) or expansion.price_range
+    min_price, max_price = price_range if price_range else (None, None)
+
+    return QueryFilters(category, brands, min_price, max_price)
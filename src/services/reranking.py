@@ -1,52 +1,55 @@
-from openai import OpenAI
-from src.config import OPENAI_API_KEY, OPENAI_MODEL
+from src.config import OPENAI_MODEL, RERANKER_BACKEND
+from src.services.stage_timer import stage
+from src.services.query_cache import normalize_query, get_rerank_cache, catalog_version
+from src.services.resource_registry import get_openai_client, get_async_openai_client
+import hashlib
 import json
+import math
+import re
 import traceback
 
 
-class RerankerService:
-    def __init__(self):
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+def _candidates(search_results):
+    documents = search_results['documents'][0]
+    ids = search_results['ids'][0]
+    distances = search_results['distances'][0]
+    has_metadatas = 'metadatas' in search_results and search_results['metadatas'][0]
 
-    def rerank(self, query, search_results, n_results=2):
-        try:
-            if not search_results or 'documents' not in search_results or not search_results['documents'][0]:
-                print("Empty search results, skipping reranking")
-                return search_results
+    candidates = []
+    for i, doc in enumerate(documents):
+        candidates.append({
+            "id": ids[i],
+            "content": doc,
+            "score": float(distances[i]),
+            "metadata": search_results['metadatas'][0][i] if has_metadatas else {}
+        })
+    return candidates
 
-            # Extract the documents, ids, and distances from search results
-            documents = search_results['documents'][0]
-            ids = search_results['ids'][0]
-            distances = search_results['distances'][0]
-
-            # Prepare the documents for reranking
-            candidates = []
-            for i, doc in enumerate(documents):
-                metadata = search_results['metadatas'][0][i] if 'metadatas' in search_results and search_results['metadatas'][0] else {
-                }
-                candidates.append({
-                    "id": ids[i],
-                    "content": doc,
-                    "score": float(distances[i]),
-                    "metadata": metadata
-                })
-
-            # Prepare the prompt for reranking
-            prompt = f"""
-            You are a computer hardware expert. Analyze these product or policy descriptions and rerank them based on 
+
+class LLMRerankBackend:
+    """Asks gpt-4o to score every candidate. Slow and costly, so opt-in."""
+
+    def __init__(self):
+        self.client = get_openai_client()
+        self.async_client = get_async_openai_client()
+
+    def _build_prompt(self, query, search_results):
+        # Prepare the prompt for reranking
+        return f"""
+            You are a computer hardware expert. Analyze these product or policy descriptions and rerank them based on
             how well they match the query: "{query}".
-            
+
             Consider:
             1. Query intent and relevance to the content
             2. Specific details mentioned in the query
             3. Price or time considerations (if mentioned)
             4. Brand or specificity preferences (if mentioned)
-            
+
             For each item, assign a score from 0-10 where 10 is perfect match.
-            
+
             Items to evaluate:
-            {json.dumps(candidates, indent=2)}
-            
+            {json.dumps(_candidates(search_results), indent=2)}
+
             Return a JSON object with a "rankings" array containing reranked IDs and scores:
             {{
             "rankings": [
@@ -56,84 +59,291 @@ class RerankerService:
             }}
             """
 
-            # Call OpenAI to rerank the results
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=1000,
-                response_format={"type": "json_object"}
-            )
-
-            result_json = response.choices[0].message.content
-            try:
-                rerank_result = json.loads(result_json)
-                reranked_items = None
-
-                # Nếu đã có rankings trong kết quả
-                if isinstance(rerank_result, dict) and "rankings" in rerank_result:
-                    reranked_items = rerank_result["rankings"]
-
-                # Nếu không có rankings nhưng có một key khác chứa list
-                elif isinstance(rerank_result, dict):
-                    for key in rerank_result:
-                        if isinstance(rerank_result[key], list) and len(rerank_result[key]) > 0:
-                            reranked_items = rerank_result[key]
-                            break
-
-                # Nếu kết quả trực tiếp là một list
-                elif isinstance(rerank_result, list):
-                    reranked_items = rerank_result
-
-                # Đảm bảo reranked_items không phải là None và là một danh sách
-                if not reranked_items or not isinstance(reranked_items, list):
-                    print(f"Invalid reranking format, using original results")
-                    return search_results
-
-                # Đảm bảo các phần tử trong danh sách đều là dict và có id
-                valid_items = []
-                for item in reranked_items:
-                    if isinstance(item, dict) and "id" in item:
-                        valid_items.append(item)
-
-                if not valid_items:
-                    print("No valid items found in reranking result")
-                    return search_results
-
-                # Sắp xếp theo score nếu có
-                if all(isinstance(item, dict) and 'score' in item for item in valid_items):
-                    valid_items = sorted(
-                        valid_items, key=lambda x: x.get("score", 0), reverse=True)
-
-                reranked_ids = [item["id"] for item in valid_items[:n_results]]
-
-            except (json.JSONDecodeError, AttributeError, KeyError, TypeError) as e:
-                print(f"Error processing reranking result: {e}")
-                print(f"Raw response: {result_json}")
-                return search_results
+    def _completion_params(self, prompt):
+        return {
+            "model": OPENAI_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.2,
+            "max_tokens": 1000,
+            "response_format": {"type": "json_object"}
+        }
+
+    def rank(self, query, search_results):
+        prompt = self._build_prompt(query, search_results)
+
+        # Call OpenAI to rerank the results
+        response = self.client.chat.completions.create(
+            **self._completion_params(prompt))
+
+        return self._parse_rankings(response.choices[0].message.content)
+
+    async def rank_async(self, query, search_results):
+        prompt = self._build_prompt(query, search_results)
+
+        response = await self.async_client.chat.completions.create(
+            **self._completion_params(prompt))
+
+        return self._parse_rankings(response.choices[0].message.content)
+
+    def _parse_rankings(self, result_json):
+        try:
+            rerank_result = json.loads(result_json)
+            reranked_items = None
+
+            # Nếu đã có rankings trong kết quả
+            if isinstance(rerank_result, dict) and "rankings" in rerank_result:
+                reranked_items = rerank_result["rankings"]
+
+            # Nếu không có rankings nhưng có một key khác chứa list
+            elif isinstance(rerank_result, dict):
+                for key in rerank_result:
+                    if isinstance(rerank_result[key], list) and len(rerank_result[key]) > 0:
+                        reranked_items = rerank_result[key]
+                        break
+
+            # Nếu kết quả trực tiếp là một list
+            elif isinstance(rerank_result, list):
+                reranked_items = rerank_result
+
+            # Đảm bảo reranked_items không phải là None và là một danh sách
+            if not reranked_items or not isinstance(reranked_items, list):
+                print(f"Invalid reranking format, using original results")
+                return None
+
+            # Đảm bảo các phần tử trong danh sách đều là dict và có id
+            valid_items = []
+            for item in reranked_items:
+                if isinstance(item, dict) and "id" in item:
+                    valid_items.append(item)
+
+            if not valid_items:
+                print("No valid items found in reranking result")
+                return None
+
+            # Sắp xếp theo score nếu có
+            if all(isinstance(item, dict) and 'score' in item for item in valid_items):
+                valid_items = sorted(
+                    valid_items, key=lambda x: x.get("score", 0), reverse=True)
+
+            return [(item["id"], item.get("score")) for item in valid_items]
+
+        except (json.JSONDecodeError, AttributeError, KeyError, TypeError) as e:
+            print(f"Error processing reranking result: {e}")
+            print(f"Raw response: {result_json}")
+            return None
+
+
+class LocalRerankBackend:
+    """CPU-only reranker fusing BM25, vector similarity, price fit and brand match.
+
+    BM25 statistics are computed over the candidate set itself, which is all
+    the reranker ever sees. Price limits come from the (enhanced) query, brand
+    and price values from the candidate metadata.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, weights=None):
+        self.k1 = k1
+        self.b = b
+        self.weights = weights or {
+            "bm25": 0.4,
+            "vector": 0.35,
+            "price": 0.15,
+            "brand": 0.1
+        }
+
+    def _tokens(self, text):
+        return re.findall(r"\w+", normalize_query(text))
+
+    def _bm25_scores(self, query_tokens, documents):
+        doc_tokens = [self._tokens(doc) for doc in documents]
+        avg_length = sum(len(tokens) for tokens in doc_tokens) / \
+            len(doc_tokens) or 1.0
+
+        document_frequency = {}
+        for tokens in doc_tokens:
+            for token in set(tokens):
+                document_frequency[token] = document_frequency.get(
+                    token, 0) + 1
+
+        scores = []
+        n_docs = len(doc_tokens)
+        for tokens in doc_tokens:
+            term_counts = {}
+            for token in tokens:
+                term_counts[token] = term_counts.get(token, 0) + 1
+
+            score = 0.0
+            for token in set(query_tokens):
+                frequency = term_counts.get(token, 0)
+                if not frequency:
+                    continue
+                df = document_frequency[token]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                score += idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * (1 - self.b + self.b * len(tokens) / avg_length))
+            scores.append(score)
+        return scores
 
-            reranked_results = {
-                "ids": [[]],
-                "documents": [[]],
-                "metadatas": [[]],
-                "distances": [[]]
+    def _price_fit(self, price, price_range):
+        if price_range is None or price is None:
+            return 1.0
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return 1.0
+
+        min_price, max_price = price_range
+        if max_price is not None and price > max_price:
+            return math.exp(-(price - max_price) / max(max_price, 1.0))
+        if min_price is not None and price < min_price:
+            return math.exp(-(min_price - price) / max(min_price, 1.0))
+        return 1.0
+
+    def rank(self, query, search_results):
+        from src.services.query_filters import parse_usd_range
+
+        candidates = _candidates(search_results)
+        query_tokens = self._tokens(query)
+        query_token_set = set(query_tokens)
+        price_range = parse_usd_range(normalize_query(query))
+
+        bm25 = self._bm25_scores(
+            query_tokens, [c["content"] for c in candidates])
+        max_bm25 = max(bm25) if bm25 and max(bm25) > 0 else 1.0
+
+        ranked = []
+        for candidate, bm25_score in zip(candidates, bm25):
+            metadata = candidate["metadata"] or {}
+            brand = normalize_query(str(metadata.get("brand", "")))
+            features = {
+                "bm25": bm25_score / max_bm25,
+                # Chroma returns cosine distance, 0 is identical
+                "vector": max(0.0, 1.0 - candidate["score"]),
+                "price": self._price_fit(metadata.get("price"), price_range),
+                "brand": 1.0 if brand and set(brand.split()) <= query_token_set else 0.0
             }
+            score = sum(self.weights[name] * value for name,
+                        value in features.items())
+            ranked.append((candidate["id"], round(score * 10, 4)))
+
+        return sorted(ranked, key=lambda item: item[1], reverse=True)
+
+    async def rank_async(self, query, search_results):
+        return self.rank(query, search_results)
+
+
+RERANK_BACKENDS = {
+    "local": LocalRerankBackend,
+    "llm": LLMRerankBackend,
+}
+
 
-            id_to_index = {id: i for i, id in enumerate(ids)}
+def create_rerank_backend(name):
+    if name not in RERANK_BACKENDS:
+        raise ValueError(
+            f"Unknown reranker backend '{name}', expected one of {sorted(RERANK_BACKENDS)}")
+    return RERANK_BACKENDS[name]()
 
-            for id in reranked_ids:
-                if id in id_to_index:
-                    idx = id_to_index[id]
-                    reranked_results["ids"][0].append(ids[idx])
-                    reranked_results["documents"][0].append(documents[idx])
-                    if 'metadatas' in search_results and search_results['metadatas'][0]:
-                        reranked_results["metadatas"][0].append(
-                            search_results['metadatas'][0][idx])
-                    reranked_results["distances"][0].append(distances[idx])
 
-            return reranked_results
+class RerankerService:
+    def __init__(self, backend=None, cache=None):
+        backend_name = backend if isinstance(backend, str) else None
+        if backend is None or isinstance(backend, str):
+            backend_name = backend or RERANKER_BACKEND
+            backend = create_rerank_backend(backend_name)
+        self.backend = backend
+        self.backend_name = backend_name or type(backend).__name__
+        self.cache = cache if cache is not None else get_rerank_cache(
+            persistent=isinstance(backend, LLMRerankBackend))
+
+    def _cache_key(self, query, search_results):
+        candidate_ids = ",".join(sorted(search_results['ids'][0]))
+        raw = f"{self.backend_name}|{catalog_version()}|{normalize_query(query)}|{candidate_ids}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _cached_rankings(self, key):
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        return [tuple(item) for item in json.loads(cached)]
+
+    def _store_rankings(self, key, rankings):
+        # Failed rankings are not cached so the next call can retry
+        if rankings:
+            self.cache.set(key, json.dumps(rankings))
+
+    def _is_empty(self, search_results):
+        return not search_results or 'documents' not in search_results or not search_results['documents'][0]
+
+    def rerank(self, query, search_results, n_results=2):
+        try:
+            if self._is_empty(search_results):
+                print("Empty search results, skipping reranking")
+                return search_results
+
+            with stage("rerank"):
+                key = self._cache_key(query, search_results)
+                rankings = self._cached_rankings(key)
+                if rankings is None:
+                    rankings = self.backend.rank(query, search_results)
+                    self._store_rankings(key, rankings)
+
+            return self._apply_rankings(rankings, search_results, n_results)
+
+        except Exception as e:
+            print(f"Reranking failed: {e}")
+            traceback.print_exc()
+            return search_results
+
+    async def rerank_async(self, query, search_results, n_results=2):
+        try:
+            if self._is_empty(search_results):
+                print("Empty search results, skipping reranking")
+                return search_results
+
+            with stage("rerank"):
+                key = self._cache_key(query, search_results)
+                rankings = self._cached_rankings(key)
+                if rankings is None:
+                    rankings = await self.backend.rank_async(query, search_results)
+                    self._store_rankings(key, rankings)
+
+            return self._apply_rankings(rankings, search_results, n_results)
 
         except Exception as e:
             print(f"Reranking failed: {e}")
             traceback.print_exc()
             return search_results
+
+    def _apply_rankings(self, rankings, search_results, n_results):
+        if not rankings:
+            return search_results
+
+        documents = search_results['documents'][0]
+        ids = search_results['ids'][0]
+        distances = search_results['distances'][0]
+
+        reranked_results = {
+            "ids": [[]],
+            "documents": [[]],
+            "metadatas": [[]],
+            "distances": [[]],
+            # The backend's scores, the same whether they were just computed
+            # or come from the rerank cache
+            "rerank_scores": [[]]
+        }
+
+        id_to_index = {id: i for i, id in enumerate(ids)}
+
+        for id, score in rankings[:n_results]:
+            if id in id_to_index:
+                idx = id_to_index[id]
+                reranked_results["ids"][0].append(ids[idx])
+                reranked_results["documents"][0].append(documents[idx])
+                if 'metadatas' in search_results and search_results['metadatas'][0]:
+                    reranked_results["metadatas"][0].append(
+                        search_results['metadatas'][0][idx])
+                reranked_results["distances"][0].append(distances[idx])
+                reranked_results["rerank_scores"][0].append(score)
+
+        return reranked_results
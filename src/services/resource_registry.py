@@ -0,0 +1,216 @@
+import asyncio
+import inspect
+import threading
+
+
+class ResourceRegistry:
+    """Process-wide home of the heavy, shareable resources.
+
+    Each resource is built by its factory on first use, exactly once even
+    when several sessions ask for it at the same time, and then shared by
+    every session and agent in the process.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._resources = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown resource: {name}")
+            lock = self._locks[name]
+
+        # Per-resource lock, so building Chroma does not block the OpenAI
+        # clients (and a factory may get() other resources)
+        with lock:
+            if name not in self._resources:
+                self._resources[name] = self._factories[name]()
+            return self._resources[name]
+
+    def is_built(self, name):
+        return name in self._resources
+
+    def _take_all(self):
+        with self._lock:
+            resources = list(self._resources.items())
+            self._resources.clear()
+        return reversed(resources)
+
+    def close(self):
+        for name, resource in self._take_all():
+            close = getattr(resource, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    # AsyncOpenAI.close() is a coroutine
+                    asyncio.run(result)
+            except Exception as e:
+                print(f"Error closing {name}: {e}")
+
+    async def aclose(self):
+        for name, resource in self._take_all():
+            close = getattr(resource, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"Error closing {name}: {e}")
+
+
+def _openai_client():
+    from openai import OpenAI
+    from src.config import OPENAI_API_KEY
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+def _loop_bound_transport():
+    import weakref
+    import httpx
+
+    class LoopBoundTransport(httpx.AsyncBaseTransport):
+        """One httpx connection pool per running event loop.
+
+        Pooled connections belong to the loop that opened them. A client
+        shared by the whole process would otherwise hand a loop connections
+        from a loop that is already closed ("Event loop is closed"), for
+        example when a caller runs each message in a fresh loop.
+        """
+
+        def __init__(self):
+            self._transports = weakref.WeakKeyDictionary()
+            self._lock = threading.Lock()
+
+        def _current(self):
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                transport = self._transports.get(loop)
+                if transport is None:
+                    transport = httpx.AsyncHTTPTransport()
+                    self._transports[loop] = transport
+            return transport
+
+        async def handle_async_request(self, request):
+            return await self._current().handle_async_request(request)
+
+        async def aclose(self):
+            with self._lock:
+                transports = list(self._transports.values())
+                self._transports.clear()
+            for transport in transports:
+                try:
+                    await transport.aclose()
+                except Exception:
+                    # Bound to a loop that is gone; nothing left to close
+                    pass
+
+    return LoopBoundTransport()
+
+
+def _async_openai_client():
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    from src.config import OPENAI_API_KEY
+    return AsyncOpenAI(api_key=OPENAI_API_KEY,
+                       http_client=DefaultAsyncHttpxClient(transport=_loop_bound_transport()))
+
+
+def _chroma_client():
+    import chromadb
+    return chromadb.PersistentClient()
+
+
+def _chroma_collection(collection_name):
+    def factory():
+        from src.database.chroma import ChromaDB
+        return ChromaDB().connect(collection_name=collection_name)
+    return factory
+
+
+def _postgres_pool():
+    from src.database.postgres import get_postgres_pool
+    return get_postgres_pool()
+
+
+def _vi_helper():
+    from src.services.vietnamese_llm_helper import VietnameseLLMHelper
+    return VietnameseLLMHelper()
+
+
+def _reranker():
+    from src.services.reranking import RerankerService
+    return RerankerService()
+
+
+def _search_service():
+    from src.services.enhance_search import EnhancedSearchService
+    return EnhancedSearchService()
+
+
+def _policy_search_service():
+    from src.services.policy_search import PolicySearchService
+    return PolicySearchService()
+
+
+registry = ResourceRegistry()
+registry.register("openai_client", _openai_client)
+registry.register("async_openai_client", _async_openai_client)
+registry.register("chroma_client", _chroma_client)
+registry.register("chroma_products", _chroma_collection("computer_parts"))
+registry.register("chroma_policies", _chroma_collection("policies"))
+registry.register("postgres_pool", _postgres_pool)
+registry.register("vi_helper", _vi_helper)
+registry.register("reranker", _reranker)
+registry.register("search_service", _search_service)
+registry.register("policy_search_service", _policy_search_service)
+
+
+def get_openai_client():
+    return registry.get("openai_client")
+
+
+def get_async_openai_client():
+    return registry.get("async_openai_client")
+
+
+def get_chroma_client():
+    return registry.get("chroma_client")
+
+
+def get_chroma_db(collection_name="computer_parts"):
+    if collection_name == "computer_parts":
+        return registry.get("chroma_products")
+    if collection_name == "policies":
+        return registry.get("chroma_policies")
+    raise KeyError(f"No shared ChromaDB for collection: {collection_name}")
+
+
+def get_vi_helper():
+    return registry.get("vi_helper")
+
+
+def get_reranker():
+    return registry.get("reranker")
+
+
+def get_search_service():
+    return registry.get("search_service")
+
+
+def get_policy_search_service():
+    return registry.get("policy_search_service")
@@ -0,0 +1,229 @@
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Session whose state agents read and write in the current request. Code
+# running outside session_scope() (scripts, the benchmark) uses "default".
+_current_session = contextvars.ContextVar("current_session", default=None)
+
+DEFAULT_SESSION_ID = "default"
+
+
+@contextmanager
+def session_scope(session_id):
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+def current_session_id():
+    return _current_session.get() or DEFAULT_SESSION_ID
+
+
+class MemoryStateBackend:
+    """Session states of this process only, evicted after ttl_seconds idle."""
+
+    def __init__(self, ttl_seconds=6 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self._states = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def load(self, session_id):
+        with self._lock:
+            entry = self._states.get(session_id)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.time() > expires_at:
+                del self._states[session_id]
+                return None
+            return value
+
+    def save(self, session_id, value):
+        with self._lock:
+            self._states[session_id] = (value, time.time() + self.ttl_seconds)
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._purge_expired()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [session_id for session_id, (_, expires_at) in self._states.items()
+                   if now > expires_at]
+        for session_id in expired:
+            del self._states[session_id]
+        return len(expired)
+
+    def purge_expired(self):
+        with self._lock:
+            return self._purge_expired()
+
+
+class SQLiteStateBackend:
+    """Session states in a SQLite file that several workers on one host share."""
+
+    def __init__(self, db_path, ttl_seconds=6 * 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, timeout=10)
+        # WAL lets readers in other processes work while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS session_state (
+            session_id TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """)
+        self._conn.commit()
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM session_state WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None or time.time() > row[1]:
+            return None
+        return row[0]
+
+    def save(self, session_id, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_state (session_id, value, expires_at) VALUES (?, ?, ?)",
+                (session_id, value, time.time() + self.ttl_seconds))
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._conn.execute(
+                    "DELETE FROM session_state WHERE expires_at < ?", (time.time(),))
+                self._conn.commit()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM session_state WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM session_state WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+
+class RedisStateBackend:
+    """Session states in Redis (or a compatible server) for many hosts.
+
+    Needs the redis package; expiry is left to the server via SET EX.
+    """
+
+    def __init__(self, url, ttl_seconds=6 * 3600, prefix="techplus:session:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError(
+                "SESSION_STATE_BACKEND=redis requires the redis package (pip install redis)") from e
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def load(self, session_id):
+        return self.client.get(self.prefix + session_id)
+
+    def save(self, session_id, value):
+        self.client.set(self.prefix + session_id, value,
+                        ex=int(self.ttl_seconds))
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+    def purge_expired(self):
+        return 0
+
+
+def _empty_state():
+    return {
+        "recently_advised_products": [],
+        "recently_advised_pc": False,
+        "session_data": {}
+    }
+
+
+class SessionStateStore:
+    """Per-session conversation state on a pluggable backend.
+
+    States are stored as JSON, so every read returns a fresh copy and the
+    same session can be served by any worker that shares the backend.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def load(self, session_id):
+        value = self.backend.load(session_id)
+        state = _empty_state()
+        if value:
+            state.update(json.loads(value))
+        return state
+
+    def save(self, session_id, state):
+        self.backend.save(session_id, json.dumps(
+            state, ensure_ascii=False, default=str))
+
+    def update(self, session_id, **changes):
+        state = self.load(session_id)
+        state.update(changes)
+        self.save(session_id, state)
+        return state
+
+    def reset(self, session_id):
+        self.backend.delete(session_id)
+
+
+def create_state_backend(name, path=None, redis_url=None, ttl_seconds=6 * 3600):
+    if name == "memory":
+        return MemoryStateBackend(ttl_seconds)
+    if name == "sqlite":
+        return SQLiteStateBackend(path, ttl_seconds)
+    if name == "redis":
+        return RedisStateBackend(redis_url, ttl_seconds)
+    raise ValueError(
+        f"Unknown session state backend '{name}', expected memory, sqlite or redis")
+
+
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def get_session_state_store():
+    global _state_store
+    if _state_store is None:
+        from src.config import SESSION_STATE_BACKEND, SESSION_STATE_PATH, SESSION_STATE_REDIS_URL, SESSION_STATE_TTL
+        with _state_store_lock:
+            if _state_store is None:
+                _state_store = SessionStateStore(create_state_backend(
+                    SESSION_STATE_BACKEND,
+                    path=SESSION_STATE_PATH,
+                    redis_url=SESSION_STATE_REDIS_URL,
+                    ttl_seconds=SESSION_STATE_TTL
+                ))
+    return _state_store
@@ -1,41 +1,53 @@
+from src.services.session_state import current_session_id, get_session_state_store
+
+
 class SharedStateService:
-    _instance = None
+    """State of the conversation currently being answered.
+
+    Every call resolves the session from session_scope() and reads or writes
+    it in the session state store, so one instance can be shared by agents
+    serving many users, in this process or in other workers.
+    """
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(SharedStateService, cls).__new__(cls)
-            cls._instance.init_state()
-        return cls._instance
+    def __init__(self, store=None):
+        self.store = store or get_session_state_store()
+
+    @property
+    def session_id(self):
+        return current_session_id()
 
     def init_state(self):
-        self.recently_advised_products = []
-        self.recently_advised_pc = False
-        self.session_data = {}
+        self.store.reset(self.session_id)
 
     def set_recently_advised_products(self, products):
-        self.recently_advised_products = products
-
         pc_components = ["CPU", "Motherboard", "RAM", "GPU", "Storage", "PSU"]
         found_components = [product.get("category")
                             for product in products if "category" in product]
 
-        if len(set(found_components).intersection(pc_components)) >= 4:
-            self.recently_advised_pc = True
+        recently_advised_pc = len(
+            set(found_components).intersection(pc_components)) >= 4
+        if recently_advised_pc:
             print("Đã lưu trữ cấu hình PC vừa tư vấn")
-        else:
-            self.recently_advised_pc = False
+
+        self.store.update(
+            self.session_id,
+            recently_advised_products=products,
+            recently_advised_pc=recently_advised_pc
+        )
 
         print(
             f"SharedStateService: Đã lưu trữ {len(products)} sản phẩm tư vấn gần nhất")
 
     def get_recently_advised_products(self):
-        return self.recently_advised_products
+        return self.store.load(self.session_id)["recently_advised_products"]
 
     def is_recently_advised_pc(self):
-        return self.recently_advised_pc
+        return self.store.load(self.session_id)["recently_advised_pc"]
 
     def set_session_data(self, key, value):
-        self.session_data[key] = value
+        state = self.store.load(self.session_id)
+        state["session_data"][key] = value
+        self.store.save(self.session_id, state)
 
     def get_session_data(self, key, default=None):
-        return self.session_data.get(key, default)
+        return self.store.load(self.session_id)["session_data"].get(key, default)
@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager
+
+# Routes whose agents start by enhancing the query and then embed the
+# enhanced query as is
+SEARCH_ROUTES = {"product_advisor", "policy_advisor"}
+
+_current_work = contextvars.ContextVar("speculative_work", default=None)
+
+
+class SpeculativeWork:
+    """Pre-work for one user message, started before its route is known.
+
+    The query enhancement runs alongside AgentRouter.route_query and, once
+    done, the enhanced query's embedding is prefetched. Agents pick the
+    results up through enhance_vietnamese_query_async() and the request's
+    embedding memo; anything the chosen route does not use is cancelled.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.enhancement = None
+        self.embedding = None
+        self.agent_type = None
+        self.used = False
+
+    def start(self, vi_helper):
+        self.enhancement = asyncio.create_task(self._enhance(vi_helper))
+
+    async def _enhance(self, vi_helper):
+        # This task runs in a copy of the caller's context; without this the
+        # helper would find this very task and wait on itself
+        _current_work.set(None)
+        enhanced_query = await vi_helper.enhance_vietnamese_query_async(self.query)
+
+        # Routing has usually finished by now, so the embedding is only
+        # started when it may still be used. Only when the collection is
+        # already loaded; a route that is cancelled should not pay for
+        # loading Chroma
+        from src.services.resource_registry import get_chroma_db, registry
+        if self.agent_type in SEARCH_ROUTES | {None} and registry.is_built("chroma_products"):
+            self.embedding = get_chroma_db("computer_parts").prefetch_query(
+                enhanced_query)
+        return enhanced_query
+
+    def take_enhancement(self, query):
+        if self.enhancement is None or query != self.query or self.enhancement.cancelled():
+            return None
+        self.used = True
+        return self.enhancement
+
+    def keep_for(self, agent_type):
+        self.agent_type = agent_type
+        if agent_type not in SEARCH_ROUTES:
+            self.cancel()
+
+    def cancel(self):
+        if self.enhancement is not None and not self.enhancement.done():
+            self.enhancement.cancel()
+        if self.embedding is not None:
+            self.embedding.cancel()
+
+
+def current_speculation():
+    return _current_work.get()
+
+
+@asynccontextmanager
+async def speculative_prework(query, language="vi"):
+    """Start the search routes' query enhancement while the caller routes.
+
+    Call keep_for(agent_type) on the yielded object once the route is known.
+    Yields None when speculation is off or does not apply.
+    """
+    from src.config import SPECULATIVE_PREWORK
+
+    if not SPECULATIVE_PREWORK or language != "vi":
+        yield None
+        return
+
+    from src.services.resource_registry import get_vi_helper
+
+    work = SpeculativeWork(query)
+    token = _current_work.set(work)
+    try:
+        work.start(get_vi_helper())
+        yield work
+    finally:
+        _current_work.reset(token)
+        if not work.used:
+            work.cancel()
@@ -0,0 +1,62 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Recorder and parent frame of the stage currently running in this context.
+# Both are None unless a benchmark (or anything else) opened record_stages(),
+# so the timers cost a couple of lookups in normal chat traffic.
+_current_recorder = contextvars.ContextVar("stage_recorder", default=None)
+_current_frame = contextvars.ContextVar("stage_frame", default=None)
+
+
+class StageRecorder:
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages.setdefault(name, []).append(seconds)
+
+    def totals(self):
+        return {name: sum(values) for name, values in self.stages.items()}
+
+
+class _StageFrame:
+    def __init__(self, name):
+        self.name = name
+        self.child_time = 0.0
+
+
+@contextmanager
+def record_stages(recorder=None):
+    recorder = recorder or StageRecorder()
+    recorder_token = _current_recorder.set(recorder)
+    frame_token = _current_frame.set(None)
+    try:
+        yield recorder
+    finally:
+        _current_frame.reset(frame_token)
+        _current_recorder.reset(recorder_token)
+
+
+@contextmanager
+def stage(name):
+    recorder = _current_recorder.get()
+    if recorder is None:
+        yield
+        return
+
+    parent = _current_frame.get()
+    frame = _StageFrame(name)
+    token = _current_frame.set(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_frame.reset(token)
+
+        # Stages nest (e.g. "embed" runs inside "ann"), so each stage records
+        # its own time only and hands its inclusive time to the parent.
+        recorder.add(name, max(elapsed - frame.child_time, 0.0))
+        if parent is not None:
+            parent.child_time += elapsed
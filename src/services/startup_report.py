@@ -0,0 +1,59 @@
+import importlib
+import sys
+import threading
+import time
+
+# Taken when the first module of the app imports this one, which app.py does
+# before anything heavy
+_PROCESS_START = time.perf_counter()
+
+
+class StartupReport:
+    """Cold start timings of this process.
+
+    Records how long each lazily imported module took and the time from
+    process start to the first answered message.
+    """
+
+    def __init__(self, started_at=_PROCESS_START):
+        self.started_at = started_at
+        self.imports = {}
+        self.first_response = None
+        self._lock = threading.Lock()
+
+    def import_module(self, name):
+        if name in sys.modules:
+            return sys.modules[name]
+
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.imports.setdefault(name, elapsed)
+        print(f"Imported {name} in {elapsed * 1000:.0f}ms")
+        return module
+
+    def mark_first_response(self):
+        with self._lock:
+            if self.first_response is not None:
+                return
+            self.first_response = time.perf_counter() - self.started_at
+        print(
+            f"Time to first response: {self.first_response * 1000:.0f}ms after process start")
+
+    def lines(self):
+        with self._lock:
+            imports = sorted(self.imports.items(),
+                             key=lambda item: item[1], reverse=True)
+            first_response = self.first_response
+
+        lines = [f"import {name}: {seconds * 1000:.0f}ms" for name,
+                 seconds in imports]
+        if first_response is None:
+            lines.append("first response: pending")
+        else:
+            lines.append(f"first response: {first_response * 1000:.0f}ms")
+        return lines
+
+
+startup_report = StartupReport()
@@ -0,0 +1,59 @@
+import contextvars
+import inspect
+from contextlib import contextmanager
+
+# Callback receiving answer text deltas for the current request, or None
+# when the caller wants the whole answer at once
+_delta_sink = contextvars.ContextVar("delta_sink", default=None)
+
+
+@contextmanager
+def stream_to(on_delta):
+    """Send the answer generated inside this block to on_delta, piece by piece.
+
+    on_delta may be a plain function or a coroutine function. Only the
+    agents' final answer generation streams; routing, enhancement and
+    extraction calls stay non-streaming.
+    """
+    token = _delta_sink.set(on_delta)
+    try:
+        yield
+    finally:
+        _delta_sink.reset(token)
+
+
+def is_streaming():
+    return _delta_sink.get() is not None
+
+
+async def run_agent(agent, input):
+    """Runner.run that streams text deltas when a stream_to() block is active.
+
+    Returns the final output either way, so callers post-process the answer
+    as before.
+    """
+    from agents import Runner
+    from openai.types.responses import ResponseTextDeltaEvent
+
+    on_delta = _delta_sink.get()
+    if on_delta is None:
+        response = await Runner.run(agent, input)
+        return response.final_output
+
+    result = Runner.run_streamed(agent, input)
+    async for event in result.stream_events():
+        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+            delivered = on_delta(event.data.delta)
+            if inspect.isawaitable(delivered):
+                await delivered
+    return result.final_output
+
+
+async def send_text(text):
+    """Hand answer text composed without the LLM to the active stream, if any."""
+    on_delta = _delta_sink.get()
+    if on_delta is None:
+        return
+    delivered = on_delta(text)
+    if inspect.isawaitable(delivered):
+        await delivered
@@ -0,0 +1,47 @@
+import re
+from src.services.query_cache import normalize_query
+
+# Phrases (accent-free) that lean on the previous answer: "còn loại nào rẻ
+# hơn không?", "cái đó thì sao?", "so với con kia?"
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(?:con (?:loai|cai|con|mau|hang)? ?nao|loai nao|cai nao|mau nao|"
+    r"(?:re|dat|manh|tot|yeu|ben|nhanh|em|mat) hon|hon khong|khac|nua|thi sao|the con|"
+    r"cai (?:do|nay|kia)|loai (?:do|nay|kia)|con (?:do|nay|kia)|mau (?:do|nay|kia)|"
+    r"so voi|vay thi|the thi|con gi|con khong)\b")
+
+
+def is_follow_up(query):
+    return bool(FOLLOW_UP_PATTERN.search(normalize_query(query)))
+
+
+class TopicShiftDetector:
+    """Decides locally whether a message leaves the previous agent's topic.
+
+    A message stays with the previous agent when the local intent
+    classifier agrees with it, or when it reads like a follow-up and the
+    classifier is not near-certain otherwise. Everything else is a shift
+    and is routed again, since an unsure classifier (confidence 0) says
+    nothing about the topic.
+    """
+
+    def __init__(self, classifier, min_confidence=0.99):
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+
+    def detect(self, query, previous_intent, follow_up=None):
+        """Return (shifted, local classifier result).
+
+        follow_up overrides is_follow_up() for callers that recognise
+        continuations of their own, such as build edits.
+        """
+        result = self.classifier.classify(query)
+        # Below its similarity floors the classifier still names its best
+        # guess, at confidence 0; that is no agreement
+        if result["intent"] == previous_intent and result["confidence"] > 0:
+            return False, result
+
+        if follow_up is None:
+            follow_up = is_follow_up(query)
+        if not follow_up:
+            return True, result
+        return result["confidence"] >= self.min_confidence, result
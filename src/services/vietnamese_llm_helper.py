@@ -1,5 +1,8 @@
-from openai import OpenAI
-from src.config import OPENAI_API_KEY
+from src.config import LOCAL_EXPANDER_ENABLED, LOCAL_EXPANDER_MIN_COVERAGE
+from src.services.stage_timer import stage
+from src.services.query_cache import get_enhancement_cache, normalize_query
+from src.services.resource_registry import get_openai_client, get_async_openai_client
+from src.services.speculation import current_speculation
 
 CATEGORY_TRANSLATIONS = {
     "CPU": ["Nhân", "Vi xử lý", "Bộ xử lý", "Core", "Processor", "Chip", "CPU Intel", "CPU AMD", "Xử lý", "Xử lý trung tâm"],
@@ -114,10 +117,27 @@ SPEC_MAPPINGS = {
 
 class VietnameseLLMHelper:
     def __init__(self, model="gpt-4o"):
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        self.client = get_openai_client()
+        self.async_client = get_async_openai_client()
         self.model = model
+        self.cache = get_enhancement_cache()
 
-    def enhance_vietnamese_query(self, query):
+    def _cache_key(self, query):
+        return f"{self.model}:{normalize_query(query)}"
+
+    def expand_locally(self, query):
+        # Imported here because the expander compiles the tables defined above
+        from src.services.local_query_expander import get_local_expander
+
+        if not LOCAL_EXPANDER_ENABLED:
+            return None
+
+        expansion = get_local_expander().expand(query)
+        if expansion.coverage >= LOCAL_EXPANDER_MIN_COVERAGE:
+            return expansion.query
+        return None
+
+    def _build_enhance_prompt(self, query):
         category_mappings = ""
         for english_term, vietnamese_terms in CATEGORY_TRANSLATIONS.items():
             vietnamese_list = ", ".join(vietnamese_terms)
@@ -185,16 +205,70 @@ class VietnameseLLMHelper:
             Cho "CPU giá từ 10 đến 15 triệu có hiệu năng tốt nhất" bạn có thể trả về:
             "CPU processor high performance price range 400-600 USD best value"
             """
+        return prompt
+
+    def enhance_vietnamese_query(self, query):
+        cache_key = self._cache_key(query)
+        cached_query = self.cache.get(cache_key)
+        if cached_query is not None:
+            return cached_query
+
+        local_query = self.expand_locally(query)
+        if local_query:
+            return local_query
+
+        prompt = self._build_enhance_prompt(query)
+
+        try:
+            with stage("enhance"):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=200
+                )
+
+            enhanced_query = response.choices[0].message.content.strip()
+            self.cache.set(cache_key, enhanced_query)
+            return enhanced_query
+
+        except Exception as e:
+            print(f"LLM enhancement failed: {e}")
+            return query
+
+    async def enhance_vietnamese_query_async(self, query):
+        # Started alongside routing by speculative_prework()
+        speculation = current_speculation()
+        if speculation is not None:
+            enhancement = speculation.take_enhancement(query)
+            if enhancement is not None:
+                try:
+                    return await enhancement
+                except Exception as e:
+                    print(f"Speculative enhancement failed: {e}")
+
+        cache_key = self._cache_key(query)
+        cached_query = self.cache.get(cache_key)
+        if cached_query is not None:
+            return cached_query
+
+        local_query = self.expand_locally(query)
+        if local_query:
+            return local_query
+
+        prompt = self._build_enhance_prompt(query)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=200
-            )
+            with stage("enhance"):
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=200
+                )
 
             enhanced_query = response.choices[0].message.content.strip()
+            self.cache.set(cache_key, enhanced_query)
             return enhanced_query
 
         except Exception as e: